@@ -1,99 +1,168 @@
 import streamlit as st
+import instrumentation
 from crawler import Crawler
 from indexer import Indexer
 from query_processor import QueryProcessor
-import pickle
-import re
-import nltk
+from index_store import convert_json_index
+from model_bundle import BUNDLE_DIR, BundleError, ModelBundle
+from utils import startup_report, text_tokenize_lemmatize, timed_stage
 import os
-import subprocess
-import sys
-
-# Load necessary NLTK components
-nltk.download('wordnet')
-nltk.download('omw-1.4')
-lemmatizer = nltk.WordNetLemmatizer()
 
 # Constants - Define key file paths and URLs
 BASE_URL = "https://pureportal.coventry.ac.uk/"
 DATA_FILE = "publications.json"
-INDEX_FILE = "inverted_index.json"
-MODEL_FILE = "text_clf.sav"
-VECTORIZER_FILE = "text__vectorizer.sav"
-TRAIN_SCRIPT = "model_train.py"
+INDEX_FILE = "inverted_index.bin"
+LEGACY_INDEX_FILE = "inverted_index.json"  # Pretty-printed JSON index from earlier versions
+MODEL_BUNDLE = BUNDLE_DIR
+RANKING_METHODS = {"TF-IDF": "tfidf", "BM25": "bm25"}  # Sidebar label -> QueryProcessor ranking
+MATCH_OPERATORS = {"All words": "and", "Any word": "or"}  # Sidebar label -> default query operator
+PROFILERS = {"Off": None, "cProfile": "cprofile", "Sampling": "sampling"}  # Sidebar label -> request profiler
 
 @st.cache_resource  # Cache model loading to optimize performance
 def load_model():
-    if not all(os.path.exists(f) for f in [MODEL_FILE, VECTORIZER_FILE]):
-        print("Model files not found. Training model...")
-        subprocess.run([sys.executable, TRAIN_SCRIPT], check=True)
-    
-    with open(MODEL_FILE, 'rb') as model_file, open(VECTORIZER_FILE, 'rb') as vectorizer_file:
-        return pickle.load(model_file), pickle.load(vectorizer_file)
+    # Training is never started from the request path; the bundle is built by model_train.py
+    try:
+        return ModelBundle.load(MODEL_BUNDLE)
+    except BundleError as e:
+        st.error(f"{e} Train the classifier with `python model_train.py` "
+                 "or convert existing .sav files with `python model_bundle.py`.")
+        return None
 
 @st.cache_resource  # Cache initialization for efficiency
 def initialize_components():
     crawler = Crawler(BASE_URL, data_file=DATA_FILE)
-    crawler.load_data()
+    with timed_stage("load publications"):
+        crawler.load_data()
 
     if not crawler.publications:
         st.write("No existing data found. Starting crawl...")
         crawler.crawl_publications()
 
+    # Convert an index saved in the old JSON format instead of rebuilding it
+    if not os.path.exists(INDEX_FILE) and os.path.exists(LEGACY_INDEX_FILE):
+        convert_json_index(LEGACY_INDEX_FILE, INDEX_FILE)
+
     indexer = Indexer(crawler.publications, index_file=INDEX_FILE)
-    indexer.load_index()
+    with timed_stage("load index"):
+        indexer.load_index()
 
     if not indexer.inverted_index:
         st.write("No existing index found. Building index...")
         indexer.build_index()
+    elif indexer.sync_publications():
+        st.write("Indexed newly crawled publications.")  # Only the new publications are tokenized
+
+    query_processor = QueryProcessor.from_indexer(indexer)
+    with timed_stage("warm up search"):
+        query_processor.search("warm up")  # Load NLTK resources now rather than on the first user query
+    print("Startup timings:", *startup_report(), sep="\n  ")
+    return query_processor
 
-    return QueryProcessor(crawler.publications, indexer.inverted_index)
+def debug_controls():
+    """
+    Show the debug panel switch in the sidebar and return (enabled, profiler) for the next request.
+    Only the requests of a session with the panel switched on are traced; the switch does not
+    change instrumentation for other sessions.
+    """
+    enabled = st.sidebar.checkbox("Performance Debug Panel", value=instrumentation.is_enabled())
+    if not enabled:
+        return False, None
+    return True, PROFILERS[st.sidebar.selectbox("Profiler", list(PROFILERS))]
 
-# Function to preprocess text
-def text_tokenize_lemmatize(text):
-    text = re.sub(r'[^a-zA-Z]', ' ', text).lower()
-    return ' '.join(lemmatizer.lemmatize(w) for w in nltk.tokenize.WhitespaceTokenizer().tokenize(text))
+def show_debug_panel(trace):
+    """Show the stage timings, counters and profile of the last request, and the overall span statistics."""
+    with st.sidebar.expander("Performance", expanded=True):
+        if trace is not None:
+            st.write(f"**Last request:** {trace.seconds * 1000:.1f} ms")
+            st.text("\n".join(f"{'  ' * span['depth']}{span['name']:<24} {span['ms']:10.3f} ms" for span in trace.spans))
+            if trace.counters:
+                st.json(dict(trace.counters))
+            if trace.profile:
+                st.text(trace.profile)
+        st.json(instrumentation.snapshot()["spans"], expanded=False)
 
 # Streamlit App
 def main():
     st.image("coventry_logo.png", use_container_width=True)
     menu = ["Search Publications", "Subject Classification"]
     choice = st.sidebar.radio("Select an Option", menu)
+    debug, profiler = debug_controls()
 
     if choice == "Search Publications":
         st.title("Coventry University Publications Search Engine")
         st.subheader("Find publications by faculty members")
         query_processor = initialize_components()
+        ranking = st.sidebar.radio("Ranking Method", list(RANKING_METHODS))
+        match = st.sidebar.radio("Match", list(MATCH_OPERATORS))
+        st.sidebar.caption('Use AND, OR, NOT, parentheses and "quoted phrases" to refine a search.')
+
+        # Filters are resolved on the facet bitmaps before scoring
+        facets = query_processor.facets
+        filters = {
+            "authors": st.sidebar.multiselect("Authors", facets.values["author"]),
+            "journals": st.sidebar.multiselect("Journals", facets.values["journal"]),
+        }
+        years = facets.values["year"]
+        if years and years[0] < years[-1]:
+            year_range = st.sidebar.slider("Publication Year", years[0], years[-1], (years[0], years[-1]))
+            if year_range != (years[0], years[-1]):
+                filters["years"] = year_range
         
         query = st.text_input("Enter your search query:", placeholder="e.g. Accounting, Economics, Finance, Business...")
 
         if query:
-            relevant_docs = query_processor.search(query)
-            if relevant_docs:
-                st.write(f"Found {len(relevant_docs)} relevant publications:")
-                for doc_id, score in relevant_docs:
-                    pub = query_processor.publications[doc_id]
-                    with st.expander(pub['title']):
-                        st.write(f"**Authors:** {', '.join(author['name'] for author in pub['authors'])}")
-                        st.write(f"**Year:** {pub['publication_year']}")
-                        st.markdown(f"**[Publication Link]({pub['link']})**")
-                        st.markdown(f"**[Author Profile]({', '.join(author['link'] for author in pub['authors'])})**")
-                        st.write(f"**Relevance Score:** {score:.4f}")
-            else:
-                st.write("No relevant publications found. Try a different query.")
+            # Completions of the last word and spelling suggestions from the index vocabulary
+            completions = [completion for completion in query_processor.autocomplete(query) if completion != query]
+            if completions:
+                st.caption("Suggestions: " + ", ".join(completions))
+            suggestion = query_processor.suggest(query)
+            if suggestion:
+                st.markdown(f"Did you mean: **{suggestion}**? Misspelled words are also searched as their corrections.")
+            with instrumentation.request("search", profiler, traced=debug, query=query, ranking=RANKING_METHODS[ranking]) as trace:
+                relevant_docs = query_processor.search(query, ranking=RANKING_METHODS[ranking],
+                                                       operator=MATCH_OPERATORS[match], filters=filters)
+                if relevant_docs:
+                    st.write(f"Found {len(relevant_docs)} relevant publications:")
+                    with instrumentation.span("search.facets"):
+                        facet_counts = query_processor.facet_counts(doc_id for doc_id, _ in relevant_docs)
+                    with st.sidebar.expander("Result Facets"):
+                        for label, field in (("Authors", "author"), ("Years", "year"), ("Journals", "journal")):
+                            st.write(f"**{label}:** " + ", ".join(f"{value} ({count})" for value, count in facet_counts[field]))
+                    with instrumentation.span("render"):
+                        for doc_id, score in relevant_docs:
+                            pub = query_processor.publications[doc_id]
+                            with st.expander(pub['title']):
+                                st.write(f"**Authors:** {', '.join(author['name'] for author in pub['authors'])}")
+                                st.write(f"**Year:** {pub['publication_year']}")
+                                st.markdown(f"**[Publication Link]({pub['link']})**")
+                                st.markdown(f"**[Author Profile]({', '.join(author['link'] for author in pub['authors'])})**")
+                                st.write(f"**Relevance Score:** {score:.4f}")
+                else:
+                    st.write("No relevant publications found. Try a different query.")
+            if debug:
+                show_debug_panel(trace)
 
     elif choice == "Subject Classification":
         st.title("Subject Classification")
         st.subheader("Classify text into: Business, Health, or Politics")
-        model, vectorizer = load_model()
+        model = load_model()
+        if model is None:
+            return
         input_text = st.text_area("Enter text to classify:", height=150, placeholder="Type or paste your text here...")
         classify_button = st.button("Classify Text")
 
         if classify_button:
             if input_text:
-                processed_text = text_tokenize_lemmatize(input_text)
-                predicted_classification = model.predict(vectorizer.transform([processed_text]))[0]
-                st.write(f"The text belongs to: **{predicted_classification}**")
+                with instrumentation.request("classify", profiler, traced=debug, characters=len(input_text)) as trace:
+                    with instrumentation.span("classify.preprocess"):
+                        processed_text = text_tokenize_lemmatize(input_text)
+                    with instrumentation.span("classify.vectorize"):
+                        vector = model.transform([processed_text])
+                    with instrumentation.span("classify.predict"):
+                        predicted_classification = model.predict(vector)[0]
+                    st.write(f"The text belongs to: **{predicted_classification}**")
+                if debug:
+                    show_debug_panel(trace)
             else:
                 st.write("Please enter some text to classify.")
 
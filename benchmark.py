@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import re
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PUBLICATIONS_FILE = "publications.json"
+RESULTS_FILE = "benchmark_results.json"
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# Allowed change of each metric against a baseline run: (direction, ratio).
+# "lower" metrics regress when they grow above baseline * ratio, "higher" ones when they fall below it.
+THRESHOLDS = {
+    "build_seconds": ("lower", 1.25),
+    "index_bytes": ("lower", 1.10),
+    "load_seconds": ("lower", 1.25),
+    "tfidf_p50_ms": ("lower", 1.25),
+    "tfidf_p95_ms": ("lower", 1.30),
+    "tfidf_p99_ms": ("lower", 1.50),
+    "bm25_p50_ms": ("lower", 1.25),
+    "bm25_p95_ms": ("lower", 1.30),
+    "bm25_p99_ms": ("lower", 1.50),
+    "preprocess_per_second": ("higher", 0.80),
+    "classify_per_second": ("higher", 0.80),
+    "peak_rss_mb": ("lower", 1.20),
+}
+
+
+def _vocabulary(size, rng):
+    """
+    Build a vocabulary of the given size: words of the real publication titles first (most frequent
+    ranks), then pronounceable pseudo-words.
+    """
+    words = []
+    if os.path.exists(PUBLICATIONS_FILE):
+        with open(PUBLICATIONS_FILE, "r") as f:
+            for pub in json.load(f):
+                words.extend(re.findall(r"[a-z]{3,}", pub["title"].lower()))
+    vocabulary = list(dict.fromkeys(words))  # Unique, in order of first appearance
+    rng.shuffle(vocabulary)
+    seen = set(vocabulary)
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    while len(vocabulary) < size:
+        word = "".join(rng.choice(list(consonants)) + rng.choice(list(vowels)) for _ in range(rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary[:size]
+
+
+def _zipf_sampler(size, rng, exponent=1.1):
+    """Return a function drawing word ranks with Zipf-distributed frequencies, like natural text."""
+    weights = 1 / np.arange(1, size + 1) ** exponent
+    cumulative = np.cumsum(weights / weights.sum())
+    return lambda count: np.minimum(np.searchsorted(cumulative, rng.random(count)), size - 1)
+
+
+def generate_publications(count, seed=0, vocabulary_size=None):
+    """
+    Generate synthetic publication records with the crawler's schema (see extraction.parse_publications).
+
+    Titles follow a Zipf word distribution over a vocabulary that grows with the corpus; authors and
+    journals are drawn from pools that also grow with it, so postings and facets scale realistically.
+
+    :param count: Number of publications.
+    :param seed: Random seed; the same seed gives the same corpus.
+    :param vocabulary_size: Number of distinct title words. Defaults to about 20 * sqrt(count) (Heaps' law).
+    :return: List of publication dictionaries.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = _vocabulary(vocabulary_size or max(1_000, int(20 * count ** 0.5)), rng)
+    sample_words = _zipf_sampler(len(vocabulary), rng)
+
+    surnames = [word.capitalize() for word in _vocabulary(max(50, count // 20), np.random.default_rng(seed + 1))]
+    authors = [{"name": f"{surname}, {rng.choice(list(string.ascii_uppercase))}.",
+                "link": f"https://pureportal.coventry.ac.uk/en/persons/{surname.lower()}-{i}"}
+               for i, surname in enumerate(surnames)]
+    journals = [f"In:Journal of {' '.join(vocabulary[i].capitalize() for i in rng.integers(0, 200, 2))}."
+                for _ in range(max(20, count // 50))]
+    sample_author = _zipf_sampler(len(authors), rng, 0.8)
+
+    lengths = rng.integers(5, 16, count)
+    words = sample_words(int(lengths.sum()))
+    years = rng.integers(1995, 2026, count)
+    publications = []
+    start = 0
+    for i, length in enumerate(lengths):
+        title = " ".join(vocabulary[w] for w in words[start:start + length]).capitalize()
+        start += length
+        has_journal = rng.random() < 0.7
+        publications.append({
+            "title": title,
+            "authors": [authors[a] for a in dict.fromkeys(sample_author(rng.integers(1, 4)))],
+            "publication_year": str(years[i]),
+            "journal": journals[rng.integers(len(journals))] if has_journal else None,
+            "volume": f"{rng.integers(1, 60)}({rng.integers(1, 12)})" if has_journal else None,
+            "link": f"https://pureportal.coventry.ac.uk/en/publications/synthetic-{i}",
+        })
+    return publications
+
+
+def generate_queries(publications, count, seed=0):
+    """
+    Generate a query log from the corpus: mostly one to three title words, plus some OR queries
+    and quoted phrases, with popular words repeated as in real logs.
+
+    :return: List of query strings.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        words = publications[rng.integers(len(publications))]["title"].lower().split()
+        kind = rng.random()
+        size = min(len(words), int(rng.integers(1, 4)))
+        start = int(rng.integers(0, len(words) - size + 1))
+        if kind < 0.15 and size > 1:
+            queries.append(f'"{" ".join(words[start:start + size])}"')
+        elif kind < 0.3:
+            queries.append(" OR ".join(words[start:start + size]))
+        else:
+            queries.append(" ".join(rng.choice(words, size, replace=False)))
+    return queries
+
+
+def _percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 3)
+
+
+def run_scale(size, num_queries=1000, seed=0):
+    """
+    Benchmark one corpus size in the current process.
+
+    :return: Dictionary of metric -> value (see THRESHOLDS).
+    """
+    from indexer import Indexer
+    from query_processor import QueryProcessor
+    from utils import lemmatize, peak_memory_mb, preprocess_text
+
+    publications = generate_publications(size, seed)
+    queries = generate_queries(publications, num_queries, seed)
+    metrics = {"documents": size, "queries": num_queries}
+
+    with tempfile.TemporaryDirectory() as directory:
+        index_file = os.path.join(directory, "inverted_index.bin")
+        start = time.perf_counter()
+        Indexer(publications, index_file=index_file).build_index()
+        metrics["build_seconds"] = round(time.perf_counter() - start, 3)
+        metrics["index_bytes"] = sum(os.path.getsize(os.path.join(directory, name))
+                                     for name in os.listdir(directory) if os.path.isfile(os.path.join(directory, name)))
+
+        start = time.perf_counter()
+        indexer = Indexer(publications, index_file=index_file)
+        indexer.load_index()
+        query_processor = QueryProcessor.from_indexer(indexer, cache_size=0)  # Every query is evaluated
+        metrics["load_seconds"] = round(time.perf_counter() - start, 3)
+
+        for ranking in QueryProcessor.RANKINGS:
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                query_processor.search(query, top_k=10, ranking=ranking)
+                latencies.append(time.perf_counter() - start)
+            for q in (50, 95, 99):
+                metrics[f"{ranking}_p{q}_ms"] = _percentile_ms(latencies, q)
+
+    titles = [pub["title"] for pub in publications[:20_000]]
+    lemmatize.cache_clear()  # The index build has lemmatized every word already; measure from a cold cache
+    start = time.perf_counter()
+    for title in titles:
+        preprocess_text(title)
+    metrics["preprocess_per_second"] = round(len(titles) / (time.perf_counter() - start), 1)
+
+    metrics["classify_per_second"] = None
+    from model_bundle import BUNDLE_DIR
+    if os.path.exists(BUNDLE_DIR):
+        from classify_batch import classify_stream
+        lemmatize.cache_clear()  # Classification lemmatizes the same titles
+        start = time.perf_counter()
+        for _ in classify_stream(enumerate(titles), workers=0):
+            pass
+        metrics["classify_per_second"] = round(len(titles) / (time.perf_counter() - start), 1)
+
+    peak = peak_memory_mb()
+    metrics["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+    return metrics
+
+
+def compare(results, baseline, thresholds=THRESHOLDS):
+    """
+    Compare benchmark results with a baseline run.
+
+    :return: List of regression messages; empty if every metric is within its threshold.
+    """
+    regressions = []
+    for size, metrics in results["scales"].items():
+        for metric, (direction, ratio) in thresholds.items():
+            old = baseline.get("scales", {}).get(size, {}).get(metric)
+            new = metrics.get(metric)
+            if not old or new is None:
+                continue
+            if (new > old * ratio) if direction == "lower" else (new < old * ratio):
+                regressions.append(f"{size} docs: {metric} {old} -> {new} (allowed ratio {ratio})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark indexing, search and classification on a synthetic corpus.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Corpus sizes to benchmark (e.g. 1000 10000 100000 1000000)")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per size in the query log")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the corpus and query log")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="Earlier results file; exit with status 1 on regressions")
+    parser.add_argument("--write-corpus", metavar="SIZE", type=int, default=None,
+                        help="Only write a synthetic publications file of this size to --output")
+    parser.add_argument("--scale", type=int, default=None, help=argparse.SUPPRESS)  # One size, run in a child process
+    args = parser.parse_args()
+
+    if args.write_corpus:
+        with open(args.output, "w") as f:
+            json.dump(generate_publications(args.write_corpus, args.seed), f, indent=4)
+        sys.exit(0)
+
+    if args.scale:
+        # Print the metrics as the last line of output for the parent process
+        print(json.dumps(run_scale(args.scale, args.queries, args.seed)))
+        sys.exit(0)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "scales": {},
+    }
+    for size in args.sizes:
+        # Each size runs in a fresh process so that peak RSS and caches are per size
+        child = subprocess.run([sys.executable, __file__, "--scale", str(size), "--queries", str(args.queries),
+                                "--seed", str(args.seed)], capture_output=True, text=True, check=True)
+        metrics = json.loads(child.stdout.strip().splitlines()[-1])
+        results["scales"][str(size)] = metrics
+        print(f"{size:>9} docs  build {metrics['build_seconds']:8.2f} s  load {metrics['load_seconds']:6.2f} s  "
+              f"tfidf p95 {metrics['tfidf_p95_ms']:8.2f} ms  bm25 p95 {metrics['bm25_p95_ms']:8.2f} ms  "
+              f"peak {metrics['peak_rss_mb']} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}.")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        sys.exit(1 if regressions else 0)
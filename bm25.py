@@ -0,0 +1,97 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+import instrumentation
+
+class BM25Ranker:
+    """
+    A class to rank documents with Okapi BM25 directly from a term-frequency postings index.
+    """
+
+    def __init__(self, postings, doc_lengths, k1=1.5, b=0.75):
+        """
+        Initialize the BM25Ranker.
+
+        :param postings: Dictionary mapping tokens to lists of (document_id, term_frequency) pairs.
+        :param doc_lengths: List of token counts per document, indexed by document ID.
+        :param k1: Term frequency saturation parameter.
+        :param b: Document length normalization parameter (0 disables it, 1 applies it fully).
+        """
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.num_docs = 0  # Number of documents with at least one indexed token
+        self.avg_doc_length = 0.0  # Average length over those documents
+        self.doc_freqs = None  # Optional token -> document frequency of a larger collection (see use_global_statistics)
+        self.global_statistics = None
+        self.update_statistics()
+
+    def use_global_statistics(self, num_docs, avg_doc_length, doc_freqs):
+        """
+        Score with the statistics of a whole collection instead of this index's own, e.g. for one shard
+        of a sharded index, so that scores match those of the unsharded index.
+
+        :param num_docs: Number of documents with at least one indexed token in the whole collection.
+        :param avg_doc_length: Average length of those documents.
+        :param doc_freqs: Mapping of token -> document frequency in the whole collection.
+        """
+        self.global_statistics = (num_docs, avg_doc_length, doc_freqs)
+        self.update_statistics()
+
+    def update_statistics(self):
+        """
+        Recompute the collection statistics used by BM25.
+
+        Call this after documents are added to or removed from the postings.
+        """
+        if self.global_statistics is not None:
+            self.num_docs, self.avg_doc_length, self.doc_freqs = self.global_statistics
+            return
+        self.num_docs = sum(1 for length in self.doc_lengths if length)
+        self.avg_doc_length = sum(self.doc_lengths) / self.num_docs if self.num_docs else 0.0
+
+    def idf(self, doc_freq, num_docs):
+        """
+        Compute the BM25 inverse document frequency of a term.
+
+        Uses the non-negative variant log(1 + (N - df + 0.5) / (df + 0.5)).
+        """
+        return math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def score(self, query_tokens, top_k=None, doc_ids=None):
+        """
+        Score documents for the given query tokens, term at a time.
+
+        Only the postings of the query terms are touched.
+
+        :param query_tokens: List of preprocessed query tokens.
+        :param top_k: Optional maximum number of results to return (at least 1). All matches are returned when None.
+        :param doc_ids: Optional candidate document IDs (e.g. from a boolean query); other documents are skipped.
+                        Candidates without any query token still match, with a score of 0.0.
+        :return: List of tuples (document_id, bm25_score), sorted in descending order of relevance.
+        """
+        if top_k is not None and top_k < 1:
+            raise ValueError(f"top_k must be at least 1 or None, got {top_k}")
+        scores = defaultdict(float)  # Accumulator per touched document
+        if doc_ids is not None:
+            doc_ids = set(doc_ids)
+            scores.update(dict.fromkeys(doc_ids, 0.0))  # E.g. every document matching "NOT finance"
+
+        for token, query_tf in Counter(query_tokens).items():
+            token_postings = self.postings.get(token)
+            if not token_postings:
+                continue
+            doc_freq = self.doc_freqs.get(token, 0) if self.doc_freqs is not None else len(token_postings)
+            weight = query_tf * self.idf(doc_freq, self.num_docs)
+            instrumentation.count("search.postings_scanned", len(token_postings))
+            for doc_id, tf in token_postings:
+                if doc_ids is not None and doc_id not in doc_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length)
+                scores[doc_id] += weight * tf * (self.k1 + 1) / (tf + norm)
+
+        # Equal scores are ordered by document ID, so that results do not depend on postings order
+        if top_k is not None:
+            return heapq.nsmallest(top_k, scores.items(), key=lambda x: (-x[1], x[0]))
+        return sorted(scores.items(), key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,217 @@
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+from utils import preprocess_text
+
+# Parsed query nodes. Terms and phrases keep their raw text for TF-IDF scoring and
+# their preprocessed tokens for postings lookups.
+Term = namedtuple("Term", ["text", "tokens"])  # Documents containing every token
+Phrase = namedtuple("Phrase", ["text", "tokens"])  # Documents containing the tokens consecutively
+And = namedtuple("And", ["children"])
+Or = namedtuple("Or", ["children"])
+Not = namedtuple("Not", ["child"])
+
+OPERATORS = ("and", "or")  # Supported default operators between words without an explicit operator
+QUERY_TOKEN = re.compile(r'(-)(?=["(])|"([^"]*)"?|(\()|(\))|([^\s()"]+)')  # "-" before a phrase or group negates it
+
+
+class QueryParser:
+    """
+    A class to parse search queries with AND, OR, NOT, parentheses and "quoted phrases".
+
+    Operators are only recognized in upper case, so lower-case "and", "or" and "not" stay ordinary
+    (stop) words. A leading "-" also negates a word, "phrase" or (group). Words without an operator
+    between them are combined with the default operator; with "or", negated words still exclude their
+    documents from the whole sequence. Operands that preprocess to no tokens (stop words only) are dropped.
+    """
+
+    def __init__(self, default_operator="and"):
+        """
+        Initialize the QueryParser.
+
+        :param default_operator: "and" to require every word, "or" to match any word.
+        """
+        if default_operator not in OPERATORS:
+            raise ValueError(f"Unknown default operator: {default_operator}")
+        self.default_operator = default_operator
+
+    def parse(self, query):
+        """
+        Parse a query string.
+
+        :param query: User input query string.
+        :return: Query node, or None if the query has no searchable tokens.
+        """
+        self._tokens = self._lex(query)
+        self._position = 0
+        node = self._parse_or()
+        while self._position < len(self._tokens):  # Unbalanced ")": parse the rest and combine it
+            self._position += 1
+            node = self._combine(And if self.default_operator == "and" else Or, [node, self._parse_or()])
+        return node
+
+    @staticmethod
+    def _lex(query):
+        tokens = []
+        for negation, phrase, opening, closing, word in QUERY_TOKEN.findall(query):
+            if negation:
+                tokens.append(("NOT", None))
+            elif opening or closing:
+                tokens.append(("(" if opening else ")", None))
+            elif word in ("AND", "OR", "NOT"):
+                tokens.append((word, None))
+            elif word:
+                if word.startswith("-") and len(word) > 1:
+                    tokens.append(("NOT", None))
+                    word = word[1:]
+                tokens.append(("word", word))
+            else:
+                tokens.append(("phrase", phrase))
+        return tokens
+
+    def _peek(self):
+        return self._tokens[self._position][0] if self._position < len(self._tokens) else None
+
+    @staticmethod
+    def _combine(kind, children):
+        children = [child for child in children if child is not None]
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0]
+        flat = []
+        for child in children:
+            flat.extend(child.children if isinstance(child, kind) else [child])  # a AND (b AND c) -> a AND b AND c
+        return kind(tuple(flat))
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._peek() == "OR":
+            self._position += 1
+            children.append(self._parse_and())
+        return self._combine(Or, children)
+
+    def _parse_and(self):
+        groups = [[self._parse_not()]]  # Implicit OR splits the explicit AND chains
+        while self._peek() not in (None, ")", "OR"):
+            if self._peek() == "AND":
+                self._position += 1
+                groups[-1].append(self._parse_not())
+            elif self.default_operator == "and":
+                groups[-1].append(self._parse_not())
+            else:
+                groups.append([self._parse_not()])
+        # Exclusions apply to the whole implicit-OR sequence: a b -c -> (a OR b) AND NOT c
+        excluded = [group[0] for group in groups if len(group) == 1 and isinstance(group[0], Not)]
+        groups = [group for group in groups if not (len(group) == 1 and isinstance(group[0], Not))]
+        return self._combine(And, [self._combine(Or, [self._combine(And, group) for group in groups])] + excluded)
+
+    def _parse_not(self):
+        if self._peek() == "NOT":
+            self._position += 1
+            child = self._parse_not()
+            return Not(child) if child is not None else None
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        kind = self._peek()
+        if kind is None:
+            return None
+        value = self._tokens[self._position][1]
+        self._position += 1
+        if kind == "(":
+            node = self._parse_or()
+            if self._peek() == ")":
+                self._position += 1
+            return node
+        if kind in ("word", "phrase"):
+            tokens = tuple(preprocess_text(value))
+            if not tokens:
+                return None
+            return (Phrase if kind == "phrase" and len(tokens) > 1 else Term)(value, tokens)
+        return None  # Stray operator or ")"
+
+
+def scoring_terms(node):
+    """
+    Return the Term and Phrase nodes of a query that are not negated, which are the ones used for scoring.
+    """
+    if node is None or isinstance(node, Not):
+        return []
+    if isinstance(node, (Term, Phrase)):
+        return [node]
+    return [term for child in node.children for term in scoring_terms(child)]
+
+
+def query_key(node):
+    """
+    Return a hashable key identifying a parsed query by its structure and tokens.
+
+    Nodes are tuples, so e.g. And and Or nodes with the same children would compare equal themselves.
+    """
+    if isinstance(node, (Term, Phrase)):
+        return type(node).__name__, node.tokens
+    if isinstance(node, Not):
+        return "Not", query_key(node.child)
+    return (type(node).__name__,) + tuple(query_key(child) for child in node.children)
+
+
+def gallop_intersect(small, large):
+    """
+    Intersect two sorted lists of document IDs.
+
+    Each ID of the shorter list is searched in the longer one with an exponential (galloping) search
+    starting at the previous match, so the cost grows with the shorter list rather than the longer one.
+    """
+    result = []
+    low, size = 0, len(large)
+    for doc_id in small:
+        bound = 1
+        while low + bound < size and large[low + bound] < doc_id:
+            bound *= 2
+        low = bisect_left(large, doc_id, low + bound // 2, min(low + bound + 1, size))
+        if low == size:
+            break
+        if large[low] == doc_id:
+            result.append(doc_id)
+            low += 1
+    return result
+
+
+def intersect_all(lists):
+    """
+    Intersect sorted lists of document IDs, shortest (rarest term) first, stopping as soon as it is empty.
+    """
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for doc_ids in lists[1:]:
+        if not result:
+            break
+        result = gallop_intersect(result, doc_ids)
+    return list(result)
+
+
+def union_all(lists):
+    """Return the sorted union of lists of document IDs."""
+    return sorted(set().union(*lists))
+
+
+def difference(doc_ids, excluded):
+    """Return the document IDs of a sorted list that are not in the excluded list."""
+    excluded = set(excluded)
+    return [doc_id for doc_id in doc_ids if doc_id not in excluded]
+
+
+def contains_phrase(positions):
+    """
+    Check whether token positions contain a phrase.
+
+    :param positions: One collection of positions per phrase token, in phrase order.
+    :return: True if some position p of the first token has p + i in the positions of token i.
+    """
+    following = [set(token_positions) for token_positions in positions[1:]]
+    return any(all(start + i in token_positions for i, token_positions in enumerate(following, 1))
+               for start in positions[0])
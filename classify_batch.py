@@ -0,0 +1,166 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import instrumentation
+from model_bundle import BUNDLE_DIR, ModelBundle
+from utils import text_tokenize_lemmatize
+
+MODEL_BUNDLE = BUNDLE_DIR
+
+_model = None  # Model bundle of this worker process, set by _load_model
+
+
+def _load_model(bundle_dir):
+    """Load the model bundle into this process (used as the worker initializer)."""
+    global _model
+    _model = ModelBundle.load(bundle_dir)  # Memory-mapped, so the arrays are shared between workers
+
+
+def _classify_chunk(texts):
+    """
+    Classify a chunk of texts with one vectorizer call and one predict_proba call.
+
+    :return: List of (label, confidence) pairs.
+    """
+    with instrumentation.span("classify.preprocess"):
+        texts = [text_tokenize_lemmatize(text) for text in texts]
+    with instrumentation.span("classify.vectorize"):
+        vectors = _model.transform(texts)
+    with instrumentation.span("classify.predict"):
+        probabilities = _model.predict_proba(vectors)
+    instrumentation.count("classify.texts", len(texts))
+    best = probabilities.argmax(axis=1)
+    return [(str(_model.classes_[i]), float(p[i])) for i, p in zip(best, probabilities)]
+
+
+def read_records(path, text_fields, id_field=None, delimiter=None):
+    """
+    Stream (record_id, text) pairs from a CSV/TSV or JSON Lines file.
+
+    :param path: Input file; ".jsonl" files are read as JSON Lines, everything else as CSV.
+    :param text_fields: Fields joined with a space to form the text (e.g. ["Title", "Snippet"]).
+    :param id_field: Optional field used as the record ID. Defaults to the row number.
+    :param delimiter: CSV delimiter. Defaults to a tab for ".tsv" files and the NYT dataset, else a comma.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            if delimiter is None:
+                delimiter = "\t" if path.endswith(".tsv") or "\t" in f.readline() else ","
+                f.seek(0)
+            rows = csv.DictReader(f, delimiter=delimiter)
+        for number, row in enumerate(rows):
+            text = " ".join(str(row.get(field) or "") for field in text_fields)
+            yield (row[id_field] if id_field else number), text
+
+
+def classify_stream(records, bundle_dir=MODEL_BUNDLE, chunksize=1000, workers=None, max_pending=None):
+    """
+    Classify a stream of texts in chunks spread over a process pool.
+
+    Only a bounded number of chunks is in flight, so memory depends on the chunk size rather
+    than on the input size.
+
+    :param records: Iterable of (record_id, text) pairs, consumed lazily.
+    :param bundle_dir: Model bundle directory.
+    :param chunksize: Number of texts vectorized together.
+    :param workers: Number of worker processes. Defaults to the CPU count; 0 classifies in this process.
+    :param max_pending: Maximum number of chunks in flight. Defaults to twice the number of workers.
+    :return: Generator of (record_id, label, confidence) tuples in input order.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    records = iter(records)
+    chunks = iter(lambda: list(islice(records, chunksize)), [])
+
+    if workers == 0:
+        _load_model(bundle_dir)
+        for chunk in chunks:
+            ids, texts = zip(*chunk)
+            yield from ((record_id, label, confidence)
+                        for record_id, (label, confidence) in zip(ids, _classify_chunk(texts)))
+        return
+
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(workers, initializer=_load_model, initargs=(bundle_dir,)) as executor:
+        pending = deque()  # (record IDs, future) in submission order
+        for chunk in chunks:
+            ids, texts = zip(*chunk)
+            pending.append((ids, executor.submit(_classify_chunk, texts)))
+            while len(pending) >= max_pending or (pending and pending[0][1].done()):
+                ids, future = pending.popleft()
+                yield from ((record_id, label, confidence)
+                            for record_id, (label, confidence) in zip(ids, future.result()))
+        while pending:
+            ids, future = pending.popleft()
+            yield from ((record_id, label, confidence) for record_id, (label, confidence) in zip(ids, future.result()))
+
+
+def write_results(results, output):
+    """
+    Write (record_id, label, confidence) tuples as CSV, or as JSON Lines if the file ends in ".jsonl".
+
+    :param results: Iterable of result tuples.
+    :param output: Output file path, or "-" for standard output (CSV).
+    :return: Number of records written.
+    """
+    count = 0
+    f = sys.stdout if output == "-" else open(output, "w", encoding="utf-8", newline="")
+    try:
+        if output.endswith(".jsonl"):
+            for record_id, label, confidence in results:
+                f.write(json.dumps({"id": record_id, "label": label, "confidence": round(confidence, 6)}) + "\n")
+                count += 1
+        else:
+            writer = csv.writer(f)
+            writer.writerow(["id", "label", "confidence"])
+            for record_id, label, confidence in results:
+                writer.writerow([record_id, label, f"{confidence:.6f}"])
+                count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+
+def one_at_a_time_throughput(texts, bundle_dir=MODEL_BUNDLE):
+    """
+    Measure docs/sec of the single-text path used by the app (one transform and predict per text).
+    """
+    _load_model(bundle_dir)
+    start = time.perf_counter()
+    for text in texts:
+        _model.predict(_model.transform([text_tokenize_lemmatize(text)]))
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed if elapsed else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify texts from a CSV/TSV or JSON Lines file in batches.")
+    parser.add_argument("input", help="Input file (.csv, .tsv or .jsonl)")
+    parser.add_argument("output", help="Output file (.csv or .jsonl), or - for standard output")
+    parser.add_argument("--text-fields", default="Title,Snippet", help="Comma-separated fields forming the text")
+    parser.add_argument("--id-field", default=None, help="Field used as record ID (default: row number)")
+    parser.add_argument("--delimiter", default=None, help="CSV delimiter (default: detected)")
+    parser.add_argument("--chunksize", type=int, default=1000, help="Texts vectorized per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = in-process)")
+    parser.add_argument("--compare", type=int, default=0, metavar="N",
+                        help="Also measure the one-at-a-time path on the first N texts")
+    args = parser.parse_args()
+
+    records = read_records(args.input, args.text_fields.split(","), args.id_field, args.delimiter)
+    start = time.perf_counter()
+    count = write_results(classify_stream(records, chunksize=args.chunksize, workers=args.workers), args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Classified {count} texts in {elapsed:.2f}s ({count / elapsed:.1f} docs/sec).", file=sys.stderr)
+
+    if args.compare:
+        sample = [text for _, text in islice(read_records(args.input, args.text_fields.split(","),
+                                                         args.id_field, args.delimiter), args.compare)]
+        print(f"One-at-a-time path: {one_at_a_time_throughput(sample):.1f} docs/sec.", file=sys.stderr)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class CrawlState:
+    """
+    A persistent crawl frontier and checkpoint store backed by SQLite.
+
+    For every URL it records the crawl state, the validators needed for conditional requests
+    (ETag / Last-Modified), a hash of the page content and the data parsed from the page.
+    Each page is committed as soon as it is processed, so an interrupted crawl can resume.
+    """
+
+    PENDING, DONE, FAILED = "pending", "done", "failed"
+
+    def __init__(self, state_file="crawl_state.db"):
+        """
+        Initialize the CrawlState.
+
+        :param state_file: SQLite database file.
+        """
+        self.state_file = state_file
+        self.connection = sqlite3.connect(state_file, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                fetched_at REAL,
+                result TEXT
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+        """)
+        self.connection.commit()
+
+    def start_run(self):
+        """
+        Start a crawl run, or resume the last one if it never finished.
+
+        A new run marks every known page as pending again but keeps its validators,
+        content hash and parsed data for conditional requests and change detection.
+
+        :return: True if an interrupted run is being resumed.
+        """
+        row = self.connection.execute("SELECT id, finished_at FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+        if row is not None and row[1] is None:
+            return True
+        with self.connection:
+            self.connection.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),))
+            self.connection.execute("UPDATE pages SET state = ?", (self.PENDING,))
+        return False
+
+    def finish_run(self):
+        """Mark the current run as finished."""
+        with self.connection:
+            self.connection.execute("UPDATE runs SET finished_at = ? WHERE finished_at IS NULL", (time.time(),))
+
+    def add_urls(self, urls, kind):
+        """
+        Add URLs to the frontier. URLs that are already known keep their state.
+
+        :param urls: Iterable of URLs.
+        :param kind: Page type, e.g. "listing" or "author".
+        """
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO pages (url, kind, state) VALUES (?, ?, ?)",
+                                        ((url, kind, self.PENDING) for url in urls))
+
+    def urls(self, kind, state=None):
+        """
+        Return the URLs of a page type in insertion order, optionally only those in the given state.
+        """
+        if state is None:
+            rows = self.connection.execute("SELECT url FROM pages WHERE kind = ? ORDER BY rowid", (kind,))
+        else:
+            rows = self.connection.execute("SELECT url FROM pages WHERE kind = ? AND state = ? ORDER BY rowid",
+                                           (kind, state))
+        return [url for url, in rows]
+
+    def remove_urls(self, kind, keep):
+        """
+        Forget pages of a type that are no longer linked (e.g. authors who left).
+
+        :return: List of removed URLs.
+        """
+        keep = set(keep)
+        removed = [url for url in self.urls(kind) if url not in keep]
+        with self.connection:
+            self.connection.executemany("DELETE FROM pages WHERE url = ?", ((url,) for url in removed))
+        return removed
+
+    def conditional_headers(self, url):
+        """
+        Return If-None-Match / If-Modified-Since headers for a previously fetched URL.
+        """
+        row = self.connection.execute("SELECT etag, last_modified, result FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row is not None and row[2] is not None:  # Only revalidate pages whose data we still have
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def result(self, url):
+        """Return the stored parsed data of a URL, or None."""
+        row = self.connection.execute("SELECT result FROM pages WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] is not None else None
+
+    @staticmethod
+    def content_hash(text):
+        """Return the SHA-256 hex digest of page content."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def is_unchanged(self, url, text):
+        """Return whether the page content hashes to the same value as last time."""
+        row = self.connection.execute("SELECT content_hash, result FROM pages WHERE url = ?", (url,)).fetchone()
+        return row is not None and row[1] is not None and row[0] == self.content_hash(text)
+
+    def mark_done(self, url, result=None, headers=None, text=None):
+        """
+        Checkpoint a processed page.
+
+        :param url: Page URL.
+        :param result: Parsed data to store; None keeps the stored data (unchanged page).
+        :param headers: Response headers, for the ETag and Last-Modified validators (names in any case).
+        :param text: Page content, for the content hash.
+        """
+        # HTTP header names are case-insensitive, and servers differ in how they spell them
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        with self.connection:
+            self.connection.execute(
+                """UPDATE pages SET state = ?, fetched_at = ?,
+                       etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+                       content_hash = COALESCE(?, content_hash), result = COALESCE(?, result)
+                   WHERE url = ?""",
+                (self.DONE, time.time(), headers.get("etag"), headers.get("last-modified"),
+                 self.content_hash(text) if text is not None else None,
+                 json.dumps(result) if result is not None else None, url))
+
+    def mark_failed(self, url):
+        """Record that a page could not be fetched; its previous data is kept."""
+        with self.connection:
+            self.connection.execute("UPDATE pages SET state = ?, fetched_at = ? WHERE url = ?",
+                                    (self.FAILED, time.time(), url))
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
@@ -1,9 +1,10 @@
-from urllib.parse import urljoin
-import time
+from urllib.parse import urljoin, urlparse
 import json
 from urllib.robotparser import RobotFileParser
-from bs4 import BeautifulSoup
-from selenium_setup import setup_selenium
+from functools import partial
+from fetcher import FetchPool, HostRateLimiter, HttpFetcher, SeleniumFetcher
+from crawl_state import CrawlState
+from extraction import ParseStage, parse_authors, parse_publications
 
 
 class Crawler:
@@ -11,141 +12,208 @@ class Crawler:
     A web crawler to scrape publication data from a university portal.
     """
 
-    def __init__(self, base_url, crawl_delay=2, data_file="publications.json"):
+    PERSONS_PATH = "/en/organisations/fbl-school-of-economics-finance-and-accounting/persons/"  # Author listing pages
+
+    def __init__(self, base_url, crawl_delay=2, data_file="publications.json", fetcher=None, workers=4,
+                 state_file="crawl_state.db", parse_workers=None, parser=None):
         """
         Initialize the crawler with base URL, crawl delay, and data storage file.
 
         :param base_url: The base URL of the website to be crawled.
         :param crawl_delay: Time delay (in seconds) between requests to prevent overwhelming the server.
         :param data_file: Name of the file where crawled data will be stored.
+        :param fetcher: Object with fetch(url, headers=None, ready_selector=None) returning a FetchResult.
+                        Defaults to an HttpFetcher that falls back to a headless browser for blocked pages.
+        :param workers: Number of pages fetched concurrently (still subject to the per-host rate limit).
+        :param state_file: SQLite file holding the crawl frontier and per-page checkpoints.
+        :param parse_workers: Number of processes parsing fetched pages. Defaults to the CPU count;
+                              0 parses on the main thread.
+        :param parser: BeautifulSoup parser backend (e.g. "lxml"). Defaults to the fastest one installed.
         """
         self.base_url = base_url  # Store the base URL of the website
         self.crawl_delay = crawl_delay  # Set the delay between requests
         self.data_file = data_file  # Define the output file for storing scraped data
         self.publications = []  # List to store scraped publication data
         self.robot_parser = RobotFileParser()  # Initialize a robots.txt parser
+        self.rate_limiter = HostRateLimiter(crawl_delay)  # Per-host token buckets shared by all workers
+        self.fetcher = fetcher or HttpFetcher(self.rate_limiter, browser_fallback=SeleniumFetcher(self.rate_limiter))
+        self.workers = workers
+        self.state_file = state_file
+        self.parse_workers = parse_workers
+        self.parser = parser
 
     def _check_robots_txt(self):
         """
         Check the website's robots.txt file to determine crawling permissions and crawl delay.
+
+        robots.txt is plain text, so it is fetched over HTTP rather than with a browser. If it is
+        blocked and the browser fallback fetched it, the text is extracted from the browser's HTML.
         """
-        driver = setup_selenium()
-        
-        # Open the robots.txt file
-        driver.get(urljoin(self.base_url, "/robots.txt"))
-
-        # Wait for any potential Cloudflare challenge or page load
-        time.sleep(10) 
-        
-        # Parse the page content using BeautifulSoup
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        robots_txt_content = soup.get_text()
-
-        # Process each line of robots.txt
-        for line in robots_txt_content.splitlines():
-            line = line.strip()
-            if line.lower().startswith("crawl-delay:"):
-                crawl_delay = int(line[len("crawl-delay:"):].strip())
+        robots_url = urljoin(self.base_url, "/robots.txt")
+        result = self.fetcher.fetch(robots_url)
+        robots_txt = result.text if result.status == 200 else ""
+        if robots_txt.lstrip().startswith("<"):  # Browser page source wrapping the plain text
+            from bs4 import BeautifulSoup
+            robots_txt = BeautifulSoup(robots_txt, "html.parser").get_text()
+        self.robot_parser.set_url(robots_url)
+        self.robot_parser.parse(robots_txt.splitlines())
 
         # Update the crawl delay if specified in robots.txt
+        crawl_delay = self.robot_parser.crawl_delay("*")
         if crawl_delay is not None:
-            self.crawl_delay = max(self.crawl_delay, crawl_delay)
+            self.crawl_delay = max(self.crawl_delay, float(crawl_delay))
 
+        # Every request to this host now waits for a token from a bucket refilled once per crawl delay
+        self.rate_limiter.set_delay(urlparse(self.base_url).netloc, self.crawl_delay)
         print(f"Crawl delay set to: {self.crawl_delay} seconds")
 
+    def _allowed(self, url):
+        """Return whether robots.txt allows fetching the URL."""
+        return self.robot_parser.can_fetch("*", url)
 
     def crawl_publications(self):
         """
         Crawl the website to extract publication data for authors.
+
+        Pages are fetched by a pool of workers; the per-host rate limit keeps the crawl polite.
+        Every processed page is checkpointed in the crawl state, so an interrupted crawl resumes
+        where it stopped. Pages are revalidated with conditional requests and only re-parsed when
+        their content changed.
+
+        :return: Dictionary with the document IDs of "added", "changed" and "removed" publications.
         """
         print("Starting crawl...")
+        state = CrawlState(self.state_file)
+        if state.start_run():
+            print("Resuming interrupted crawl...")
         self._check_robots_txt()  # Ensure that crawling is allowed
 
-        driver = setup_selenium()  # Initialize Selenium WebDriver
-
-        author_info = []  # List to store author details
-        page = 0  # Start from the first page
+        pool = FetchPool(self.fetcher, self.workers)
         page_limit = 2  # Define the number of pages to scrape
 
-        # Loop through multiple pages to gather author information
-        while page < page_limit:
-            driver.get(f"https://pureportal.coventry.ac.uk/en/organisations/fbl-school-of-economics-finance-and-accounting/persons/?page={page}")
-            time.sleep(10)  # Wait for page to load
-
-            # Parse the page content
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            
-            # Extract author names and profile links
-            for author in soup.find_all("h3", class_="title"):
-                author_name = author.get_text(strip=True)
-                author_link = author.find("a", class_="link person")["href"]
-                author_info.append({"name": author_name, "link": urljoin("https://pureportal.coventry.ac.uk", author_link)})
-            
-            page += 1  # Move to the next page
-
-        # Loop through each author's page to extract their publications
-        for author in author_info:
-            author_url = author['link'] + "/publications"  # Construct publication URL
-            driver.get(author_url)
-    
-            time.sleep(10)  # Allow page to load
-
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-    
-            # Loop through each publication entry
-            for pub_item in soup.find_all("li", class_="list-result-item"):
-                pub_title = pub_item.find("h3", class_="title").get_text(strip=True)  # Extract publication title
-                
-                # Extract authors (a publication may have multiple authors)
-                authors = []
-                author_details = pub_item.find_all("a", class_="link person")
-                for author in author_details:
-                    author_name = author.get_text(strip=True)
-                    author_profile = author['href']
-                    authors.append({'name': author_name, 'link': author_profile})
-                
-                # Extract publication year
-                pub_year = None
-                year_element = pub_item.find("div", class_="search-result-group")
-                if year_element:
-                    pub_year = year_element.get_text(strip=True)
-
-                # If no publication year is found, assume no publications and move to the next author
-                if pub_year is None:
-                    continue
-                
-                # Extract journal name and volume if available
-                journal_info = pub_item.find("span", class_="journal")
-                journal_name = journal_info.get_text(strip=True) if journal_info else None
-                volume_info = pub_item.find("span", class_="volume")
-                volume = volume_info.get_text(strip=True) if volume_info else None
-                
-                # Extract publication link
-                pub_link = pub_item.find("a", class_="link")["href"]
-                
-                # Create a dictionary for the publication data
-                publication_data = {
-                    "title": pub_title,
-                    "authors": authors,
-                    "publication_year": pub_year,
-                    "journal": journal_name,
-                    "volume": volume,
-                    "link": urljoin("https://pureportal.coventry.ac.uk", pub_link),
-                }
-
-                # Store the extracted publication data
-                self.publications.append(publication_data)
-                
+        # Fetch the author listing pages and gather author information
+        listing_urls = [urljoin(self.base_url, f"{self.PERSONS_PATH}?page={page}") for page in range(page_limit)]
+        listing_urls = list(filter(self._allowed, listing_urls))
+        state.add_urls(listing_urls, "listing")
+        self._process_pages(pool, state, "listing", partial(parse_authors, base_url=self.base_url, parser=self.parser),
+                            ready_selector="h3.title")
+        author_info = [author for url in listing_urls for author in state.result(url) or []]  # Author details
+
+        # Fetch each author's publications page and extract their publications
+        author_urls = [author["link"] + "/publications" for author in author_info]  # Construct publication URLs
+        author_urls = list(dict.fromkeys(filter(self._allowed, author_urls)))
+        state.add_urls(author_urls, "author")
+        state.remove_urls("author", keep=author_urls)  # Authors no longer listed drop their publications
+        self._process_pages(pool, state, "author",
+                            partial(parse_publications, base_url=self.base_url, parser=self.parser),
+                            ready_selector="li.list-result-item")
+        publications = [pub for url in author_urls for pub in state.result(url) or []]
+
+        self.fetcher.close()
+        changes = self._apply_crawl_results(publications)
+        state.finish_run()
+        state.close()
+        print(f"Added {len(changes['added'])}, changed {len(changes['changed'])} "
+              f"and removed {len(changes['removed'])} publications.")
+
         # Save the collected data to a file
         self.save_data()
+        return changes
+
+    def _process_pages(self, pool, state, kind, parse, ready_selector=None):
+        """
+        Fetch and parse the pending (or failed) pages of one type, checkpointing each page.
+
+        Fetching and parsing are separate stages: fetch threads keep downloading while a
+        process pool parses the pages that changed.
+
+        :param pool: FetchPool used for fetching.
+        :param state: CrawlState holding the frontier.
+        :param kind: Page type in the crawl state ("listing" or "author").
+        :param parse: Picklable function extracting data from the page source.
+        :param ready_selector: CSS selector marking the page as loaded (for browser fetches).
+        """
+        urls = state.urls(kind, CrawlState.PENDING) + state.urls(kind, CrawlState.FAILED)
+        headers = {url: state.conditional_headers(url) for url in urls}
+        fetched = {}  # URL -> FetchResult waiting in the parse stage
+        unchanged = 0
+
+        def changed_pages():
+            nonlocal unchanged
+            for url, result in pool.fetch_all(urls, ready_selector=ready_selector, headers=headers):
+                if isinstance(result, Exception) or result.status not in (200, 304):
+                    print(f"Failed to fetch {url}: {result if isinstance(result, Exception) else result.status}")
+                    state.mark_failed(url)
+                elif result.status == 304 or state.is_unchanged(url, result.text):
+                    state.mark_done(url, headers=result.headers)  # Keep the stored data without parsing
+                    unchanged += 1
+                else:
+                    fetched[url] = result
+                    yield url, result.text
+
+        stage = ParseStage(parse, workers=self.parse_workers)
+        for url, data in stage.run(changed_pages()):
+            result = fetched.pop(url)
+            if not data and state.result(url):
+                # A page that had results parsing to none is most likely a challenge or error page,
+                # so keep its stored data (and the index) instead of removing everything it listed
+                print(f"Failed to parse {url}: no results found on a page that had them")
+                state.mark_failed(url)
+                continue
+            state.mark_done(url, data, result.headers, result.text)
+        stats = stage.stats()
+        print(f"{kind.capitalize()} pages: {stats['pages']} parsed "
+              f"({stats['pages_per_second']:.1f} pages/sec parsing), "
+              f"{unchanged} unchanged.")
+
+    def _apply_crawl_results(self, publications):
+        """
+        Merge freshly crawled publications into the current list, keeping document IDs stable.
+
+        Publications are identified by their link. Changed ones are replaced in place, new ones
+        appended and missing ones (or duplicates) replaced by None.
+
+        :param publications: Publications found by the crawl, possibly with duplicates (co-authors).
+        :return: Dictionary with the document IDs of "added", "changed" and "removed" publications.
+        """
+        known = {}  # Link -> document ID of its first occurrence
+        removed = []
+        for doc_id, pub in enumerate(self.publications):
+            if pub is None:
+                continue
+            if pub["link"] in known:
+                removed.append(doc_id)  # Duplicate of an earlier entry
+            else:
+                known[pub["link"]] = doc_id
+
+        added, changed, seen = [], [], set()
+        for pub in publications:
+            if pub["link"] in seen:
+                continue
+            seen.add(pub["link"])
+            doc_id = known.get(pub["link"])
+            if doc_id is None:
+                self.publications.append(pub)
+                added.append(len(self.publications) - 1)
+            elif self.publications[doc_id] != pub:
+                self.publications[doc_id] = pub
+                changed.append(doc_id)
+
+        removed += [doc_id for link, doc_id in known.items() if link not in seen]
+        for doc_id in removed:
+            self.publications[doc_id] = None
+        return {"added": added, "changed": changed, "removed": sorted(removed)}
 
     def save_data(self):
         """
         Save the scraped publication data to a JSON file.
+
+        Removed publications are saved as null so that document IDs stay stable.
         """
         with open(self.data_file, "w") as f:
             json.dump(self.publications, f, indent=4)  # Save data in a structured JSON format
-        print(f"Crawled {len(self.publications)} publications. Data saved to {self.data_file}.")
+        print(f"Crawled {sum(pub is not None for pub in self.publications)} publications. "
+              f"Data saved to {self.data_file}.")
 
     def load_data(self):
         """
@@ -156,3 +224,19 @@ class Crawler:
                 self.publications = json.load(f)  # Load data from file
         except FileNotFoundError:
             print("No existing data found. Please run the crawler first.")  # Notify user if data is missing
+
+
+if __name__ == "__main__":
+    # Refresh the publications and apply only the changes to the search index (e.g. from a nightly job)
+    from indexer import Indexer
+
+    crawler = Crawler("https://pureportal.coventry.ac.uk/")
+    crawler.load_data()
+    changes = crawler.crawl_publications()
+
+    indexer = Indexer(crawler.publications, index_file="inverted_index.bin")
+    indexer.load_index()
+    if indexer.inverted_index:
+        indexer.apply_crawl_changes(changes)
+    else:
+        indexer.build_index()
@@ -0,0 +1,223 @@
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+import numpy as np
+
+FIELDS = ("author", "year", "journal")  # Publication fields with a facet index
+
+
+class Bitmap:
+    """
+    A set of document IDs stored roaring-style: a sorted ID array while the set is sparse,
+    a packed bit array (one bit per document) once it is dense.
+    """
+
+    DENSE_RATIO = 32  # A uint32 ID costs 32 bits, so bits are smaller from num_docs / 32 IDs on
+
+    def __init__(self, doc_ids, num_docs):
+        """
+        Initialize the Bitmap.
+
+        :param doc_ids: Iterable of document IDs in the set.
+        :param num_docs: Number of documents in the collection.
+        """
+        doc_ids = np.unique(np.asarray(doc_ids, dtype=np.int64))
+        self.num_docs = num_docs
+        self.count = len(doc_ids)
+        if self.count * self.DENSE_RATIO >= num_docs:
+            mask = np.zeros(num_docs, dtype=bool)
+            mask[doc_ids] = True
+            self.bits, self.doc_ids = np.packbits(mask), None
+        else:
+            self.bits, self.doc_ids = None, doc_ids.astype(np.uint32)
+
+    def add_to(self, mask):
+        """
+        Set the bits of this set's documents in a boolean mask (in place). The mask may be longer
+        than num_docs, e.g. for a bitmap kept by FacetIndex.updated while documents were added.
+        """
+        if self.bits is not None:
+            mask[:self.num_docs] |= np.unpackbits(self.bits, count=self.num_docs).view(bool)
+        else:
+            mask[self.doc_ids] = True
+
+    def to_array(self):
+        """Return the sorted document IDs of the set."""
+        if self.bits is not None:
+            return np.flatnonzero(np.unpackbits(self.bits, count=self.num_docs))
+        return self.doc_ids.astype(np.int64)
+
+    def mask(self):
+        """Return the set as a boolean mask of length num_docs."""
+        mask = np.zeros(self.num_docs, dtype=bool)
+        self.add_to(mask)
+        return mask
+
+
+class FacetIndex:
+    """
+    Per-field indexes over publication metadata (authors, publication year and journal).
+
+    Every field value has a Bitmap of its documents, so filters are resolved by bitmap unions and
+    intersections before any scoring. Facet counts for a set of documents use a forward index
+    (document -> value IDs, stored in CSR form) and touch only those documents.
+    Changed documents are applied with updated, which returns a new index and leaves this one untouched.
+    """
+
+    def __init__(self, publications):
+        """
+        Build the facet index.
+
+        :param publications: List of publication dictionaries (None for deleted publications).
+        """
+        self.num_docs = len(publications)
+        field_docs = {field: defaultdict(list) for field in FIELDS}
+        for doc_id, pub in enumerate(publications):
+            if pub:
+                for field, value in self.field_values(pub):
+                    field_docs[field][value].append(doc_id)
+
+        self.values = {}  # Field -> sorted distinct values
+        self.bitmaps = {}  # Field -> value -> Bitmap of its documents
+        self._forward = {}  # Field -> (indptr, value IDs) per document
+        for field, docs in field_docs.items():
+            self.values[field] = sorted(docs)
+            self.bitmaps[field] = {value: Bitmap(docs[value], self.num_docs) for value in self.values[field]}
+
+            pairs = sorted((doc_id, value_id) for value_id, value in enumerate(self.values[field])
+                           for doc_id in docs[value])
+            doc_ids = np.array([doc_id for doc_id, _ in pairs], dtype=np.int64)
+            indptr = np.searchsorted(doc_ids, np.arange(self.num_docs + 1))
+            self._forward[field] = indptr, np.array([value_id for _, value_id in pairs], dtype=np.int64)
+
+    def updated(self, documents):
+        """
+        Return a facet index with some documents added, changed or deleted, without rebuilding it.
+
+        Only the bitmaps of the values those documents had or now have are rebuilt; the others are
+        shared with this index, which searches may still be using.
+
+        :param documents: Dictionary of document ID -> publication, or None for a deletion.
+        """
+        index = FacetIndex.__new__(FacetIndex)
+        index.num_docs = max(self.num_docs, max(documents, default=-1) + 1)
+        index.values, index.bitmaps, index._forward = {}, {}, {}
+        touched = np.array(sorted(documents), dtype=np.int64)
+        new_docs = {field: defaultdict(list) for field in FIELDS}
+        for doc_id in sorted(documents):
+            if documents[doc_id]:
+                for field, value in self.field_values(documents[doc_id]):
+                    new_docs[field][value].append(doc_id)
+
+        for field in FIELDS:
+            values, bitmaps = self.values[field], dict(self.bitmaps[field])
+            indptr, value_ids = self._forward[field]
+            old_ids = value_ids[self._value_positions(indptr, touched[touched < self.num_docs])]
+            changed = {values[i] for i in np.unique(old_ids)} | set(new_docs[field])
+
+            # Rebuild the bitmaps of the changed values; values left without documents are removed
+            removed, inserted = [], []
+            for value in changed:
+                doc_ids = bitmaps[value].to_array() if value in bitmaps else np.empty(0, dtype=np.int64)
+                doc_ids = np.union1d(doc_ids[~np.isin(doc_ids, touched)], new_docs[field].get(value, []))
+                if len(doc_ids):
+                    if value not in bitmaps:
+                        inserted.append(value)
+                    bitmaps[value] = Bitmap(doc_ids, index.num_docs)
+                elif value in bitmaps:
+                    removed.append(value)
+                    del bitmaps[value]
+
+            # Renumber the value IDs when values were inserted or removed (both lists are sorted)
+            remap = np.arange(len(values))
+            if removed or inserted:
+                removed_ids = sorted(bisect_left(values, value) for value in removed)
+                inserted_at = sorted(bisect_left(values, value) for value in inserted)
+                remap += np.searchsorted(inserted_at, remap, side="right") - np.searchsorted(removed_ids, remap)
+                values = list(values)  # The old list stays with this index
+                for i in reversed(removed_ids):
+                    del values[i]
+                for value in inserted:
+                    insort(values, value)
+            index.values[field] = values
+            index.bitmaps[field] = bitmaps
+
+            # Forward index: the pairs of untouched documents, then the new pairs of touched documents
+            pair_docs = np.repeat(np.arange(self.num_docs), np.diff(indptr))
+            keep = ~np.isin(pair_docs, touched)
+            new_pairs = sorted((doc_id, bisect_left(values, value))
+                               for value, doc_ids in new_docs[field].items() for doc_id in doc_ids)
+            pair_docs = np.concatenate([pair_docs[keep], np.array([doc_id for doc_id, _ in new_pairs], dtype=np.int64)])
+            pair_ids = np.concatenate([remap[value_ids[keep]], np.array([i for _, i in new_pairs], dtype=np.int64)])
+            order = np.argsort(pair_docs, kind="stable")  # Two sorted runs: merged in linear time
+            indptr = np.concatenate([[0], np.cumsum(np.bincount(pair_docs, minlength=index.num_docs))])
+            index._forward[field] = indptr, pair_ids[order]
+        return index
+
+    @staticmethod
+    def _value_positions(indptr, doc_ids):
+        """Return the positions of the value IDs of the given documents in the forward index, concatenated."""
+        starts, lengths = indptr[doc_ids], indptr[doc_ids + 1] - indptr[doc_ids]
+        return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+    @staticmethod
+    def field_values(pub):
+        """
+        Yield the (field, value) pairs of a publication: every author name, the year as an integer
+        and the journal name without the "In:" prefix and trailing period.
+        """
+        for author in pub.get("authors") or ():
+            if author.get("name"):
+                yield "author", author["name"]
+        year = str(pub.get("publication_year") or "")
+        if year.isdigit():
+            yield "year", int(year)
+        if pub.get("journal"):
+            journal = re.sub(r"^In:\s*", "", pub["journal"]).rstrip(". ")
+            if journal:
+                yield "journal", journal
+
+    def filter_mask(self, authors=None, years=None, journals=None):
+        """
+        Return a boolean mask of the documents matching all given filters, or None without filters.
+
+        :param authors: Optional author names; a document matches if it has any of them.
+        :param years: Optional inclusive (first_year, last_year) range.
+        :param journals: Optional journal names; a document matches if it appeared in any of them.
+        """
+        selected = {"author": authors or (), "journal": journals or ()}
+        if years:
+            selected["year"] = [year for year in self.values["year"] if years[0] <= year <= years[1]]
+
+        mask = None
+        for field, values in selected.items():
+            if field != "year" and not values:
+                continue
+            field_mask = np.zeros(self.num_docs, dtype=bool)
+            for value in values:
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is not None:
+                    bitmap.add_to(field_mask)  # Union of the selected values
+            mask = field_mask if mask is None else mask & field_mask  # Intersection across fields
+        return mask
+
+    def facet_counts(self, doc_ids, top=None):
+        """
+        Count the field values of a set of documents.
+
+        :param doc_ids: Iterable of document IDs, e.g. the candidates of a query.
+        :param top: Optional maximum number of values returned per field.
+        :return: Dictionary of field -> list of (value, count) pairs, most frequent first.
+        """
+        doc_ids = np.asarray(list(doc_ids), dtype=np.int64)
+        doc_ids = doc_ids[doc_ids < self.num_docs]
+        counts = {}
+        for field in FIELDS:
+            indptr, value_ids = self._forward[field]
+            field_counts = np.bincount(value_ids[self._value_positions(indptr, doc_ids)],
+                                       minlength=len(self.values[field]))
+            order = np.flatnonzero(field_counts)
+            order = order[np.argsort(-field_counts[order], kind="stable")][:top]
+            counts[field] = [(self.values[field][i], int(field_counts[i])) for i in order]
+        return counts
@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# A fetched page: final URL, HTTP status code, decoded body and response headers (a case-insensitive mapping)
+FetchResult = namedtuple("FetchResult", ["url", "status", "text", "headers"])
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket: at most `capacity` requests at once, refilled at `rate` tokens per second.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        Initialize the TokenBucket.
+
+        :param rate: Tokens added per second (e.g. 1 / crawl_delay).
+        :param capacity: Maximum number of tokens, i.e. the largest allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Keeps one token bucket per host, so each host is limited independently.
+    """
+
+    def __init__(self, default_delay=2):
+        """
+        Initialize the HostRateLimiter.
+
+        :param default_delay: Seconds between requests to a host without its own delay.
+        """
+        self.default_delay = default_delay
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_delay(self, host, delay):
+        """Set the minimum delay (e.g. the robots.txt crawl-delay) between requests to a host."""
+        with self._lock:
+            self._buckets[host] = TokenBucket(1 / delay) if delay > 0 else None
+
+    def wait(self, url):
+        """Block until a request to the URL's host is allowed."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(1 / self.default_delay) if self.default_delay > 0 else None
+            bucket = self._buckets[host]
+        if bucket is not None:
+            bucket.acquire()
+
+
+class HttpFetcher:
+    """
+    Fetches pages over plain HTTP with a shared connection pool and per-host rate limiting.
+
+    If a page is blocked (e.g. by a bot challenge) it can fall back to a browser fetcher.
+    """
+
+    BLOCKED_STATUSES = (403, 429, 503)  # Responses that usually mean a challenge page rather than content
+
+    def __init__(self, rate_limiter=None, timeout=30, browser_fallback=None):
+        """
+        Initialize the HttpFetcher.
+
+        :param rate_limiter: HostRateLimiter shared by all requests. Defaults to 2 seconds per host.
+        :param timeout: Request timeout in seconds.
+        :param browser_fallback: Optional fetcher (e.g. SeleniumFetcher) used when a page is blocked.
+        """
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.timeout = timeout
+        self.browser_fallback = browser_fallback
+        self._local = threading.local()  # requests.Session is not thread-safe, so use one per worker thread
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers["User-Agent"] = USER_AGENT
+        return self._local.session
+
+    def fetch(self, url, headers=None, ready_selector=None):
+        """
+        Fetch a page.
+
+        :param url: Page URL.
+        :param headers: Optional extra request headers.
+        :param ready_selector: CSS selector of an element that marks the page as loaded; only used
+                               by the browser fallback.
+        :return: FetchResult.
+        """
+        self.rate_limiter.wait(url)
+        response = self._session().get(url, headers=headers, timeout=self.timeout)
+        if response.status_code in self.BLOCKED_STATUSES and self.browser_fallback is not None:
+            return self.browser_fallback.fetch(url, ready_selector=ready_selector)
+        return FetchResult(response.url, response.status_code, response.text, response.headers)
+
+    def close(self):
+        """Close the browser fallback, if one was started."""
+        if self.browser_fallback is not None:
+            self.browser_fallback.close()
+
+
+class SeleniumFetcher:
+    """
+    Fetches pages with a headless browser, for pages that need JavaScript or a bot challenge solved.
+
+    Instead of sleeping a fixed time it waits until a given element is present.
+    """
+
+    def __init__(self, rate_limiter=None, timeout=30):
+        """
+        Initialize the SeleniumFetcher. The browser is started on the first fetch.
+
+        :param rate_limiter: HostRateLimiter shared by all requests. Defaults to 2 seconds per host.
+        :param timeout: Maximum seconds to wait for a page to become ready.
+        """
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.timeout = timeout
+        self._driver = None
+        self._lock = threading.Lock()  # A single browser serves one page at a time
+
+    def fetch(self, url, headers=None, ready_selector=None):
+        """
+        Fetch a page in the browser.
+
+        :param url: Page URL.
+        :param headers: Ignored; browsers do not support per-request headers.
+        :param ready_selector: CSS selector of an element that marks the page as loaded.
+                               Without it the fetch waits for the document to finish loading.
+        :return: FetchResult (the browser does not expose the status code, so 200 is reported).
+        :raises TimeoutException: If the page is not ready within the timeout, e.g. a bot challenge
+                                  that was not solved. The page then counts as failed, not as empty.
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.rate_limiter.wait(url)
+        with self._lock:
+            if self._driver is None:
+                from selenium_setup import setup_selenium
+                self._driver = setup_selenium()
+            self._driver.get(url)
+            wait = WebDriverWait(self._driver, self.timeout)
+            if ready_selector:
+                wait.until(expected_conditions.presence_of_element_located((By.CSS_SELECTOR, ready_selector)),
+                           f"Timed out waiting for {ready_selector} on {url}")
+            else:
+                wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete",
+                           f"Timed out loading {url}")
+            return FetchResult(self._driver.current_url, 200, self._driver.page_source, {})
+
+    def close(self):
+        """Quit the browser."""
+        with self._lock:
+            if self._driver is not None:
+                self._driver.quit()
+                self._driver = None
+
+
+class FetchPool:
+    """
+    Fetches many URLs concurrently with a pool of worker threads.
+
+    Rate limits are enforced by the fetcher, so workers only overlap waiting on the network.
+    """
+
+    def __init__(self, fetcher, workers=4, pending_per_worker=4):
+        """
+        Initialize the FetchPool.
+
+        :param fetcher: HttpFetcher or SeleniumFetcher.
+        :param workers: Number of worker threads.
+        :param pending_per_worker: URLs submitted but not yet returned, per worker thread.
+        """
+        self.fetcher = fetcher
+        self.workers = workers
+        self.max_pending = workers * pending_per_worker
+
+    def fetch_all(self, urls, ready_selector=None, headers=None):
+        """
+        Fetch all URLs and yield (url, FetchResult or exception) pairs in input order.
+
+        A failing URL yields its exception instead of aborting the whole crawl.
+
+        :param urls: Iterable of URLs, consumed lazily.
+        :param ready_selector: CSS selector passed on to the fetcher.
+        :param headers: Optional dictionary of URL -> extra request headers (e.g. conditional request headers).
+        """
+        headers = headers or {}
+
+        def fetch(url):
+            try:
+                return self.fetcher.fetch(url, headers=headers.get(url), ready_selector=ready_selector)
+            except Exception as error:  # Network errors, timeouts, browser errors
+                return error
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Sliding window of (url, future) in input order: at most max_pending fetches in flight,
+            # refilled as results are consumed, instead of submitting the whole crawl at once
+            pending = deque()
+            for url in urls:
+                pending.append((url, executor.submit(fetch, url)))
+                if len(pending) >= self.max_pending:
+                    url, future = pending.popleft()
+                    yield url, future.result()
+            while pending:
+                url, future = pending.popleft()
+                yield url, future.result()
@@ -0,0 +1,380 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+# Binary index layout (all integers little-endian):
+#   header           magic, version, flags, term count, document count, CRC32 of the body, section offsets
+#   doc lengths      uint32 per document
+#   term offsets     uint32 per term (+1), byte offsets into the term blob
+#   postings offsets uint64 per term (+1), byte offsets into the postings blob
+#   term blob        UTF-8 terms, sorted by their encoded bytes
+#   postings blob    per term: varint (doc ID delta, term frequency) pairs
+#   positions offsets uint64 per term (+1), byte offsets into the positions blob (version 2)
+#   positions blob   per term: varint (doc ID delta, count, position deltas...) (version 2, FLAG_POSITIONS)
+MAGIC = b"CUIX"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIII7Q")
+HEADER_V1 = struct.Struct("<4sHHIII5Q")  # Version 1 files have no positions sections
+FLAG_POSITIONS = 1  # The file stores token positions
+CACHE_PAIRS = 1_000_000  # Decoded (document_id, ...) pairs kept for recently looked-up terms
+
+
+class IndexFormatError(ValueError):
+    """Raised when a binary index file is malformed, of an unsupported version, or fails its checksum."""
+
+
+def encode_varint(value, out):
+    """Append an unsigned integer to a bytearray as a LEB128 varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data):
+    """
+    Decode a bytes-like object holding consecutive LEB128 varints into an int64 NumPy array.
+
+    All varints are decoded at once: a byte without the continuation bit ends a value, and the
+    7-bit groups of each value are shifted into place and summed per value.
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)  # Last byte of every value
+    if len(ends) == len(data):
+        return data.astype(np.int64)  # Every value fits in one byte
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    value_lengths = ends - starts + 1
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, value_lengths))
+    groups = (data & 0x7F).astype(np.int64) << shifts
+    return np.add.reduceat(groups, starts)
+
+
+def _pad(buffer):
+    """Pad a bytearray with zero bytes to an 8-byte boundary."""
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+
+def write_binary_index(path, postings, doc_lengths, positions=None):
+    """
+    Write a term-frequency postings index to a compact binary file.
+
+    The file is written to a temporary path first and then moved into place.
+
+    :param path: Destination file path.
+    :param postings: Mapping of token -> list of (document_id, term_frequency) pairs.
+    :param doc_lengths: Sequence of token counts per document, indexed by document ID.
+    :param positions: Optional mapping of token -> list of (document_id, positions) pairs,
+                      stored in a separate section so that plain postings decode as fast as before.
+    """
+    terms = sorted((term.encode("utf-8"), term) for term, pairs in postings.items() if pairs)
+
+    term_offsets = array("I", [0])
+    postings_offsets = array("Q", [0])
+    positions_offsets = array("Q", [0])
+    term_blob = bytearray()
+    postings_blob = bytearray()
+    positions_blob = bytearray()
+    for encoded, term in terms:
+        previous = 0
+        for doc_id, tf in sorted(postings[term]):
+            encode_varint(doc_id - previous, postings_blob)  # Gaps between sorted IDs stay small
+            encode_varint(tf, postings_blob)
+            previous = doc_id
+        if positions is not None:
+            previous = 0
+            for doc_id, doc_positions in sorted(positions.get(term, ())):
+                encode_varint(doc_id - previous, positions_blob)
+                encode_varint(len(doc_positions), positions_blob)
+                last = 0
+                for position in doc_positions:
+                    encode_varint(position - last, positions_blob)
+                    last = position
+                previous = doc_id
+        term_blob += encoded
+        term_offsets.append(len(term_blob))
+        postings_offsets.append(len(postings_blob))
+        positions_offsets.append(len(positions_blob))
+
+    body = bytearray()
+    sections = []
+    for section in (array("I", doc_lengths).tobytes(), term_offsets.tobytes(), postings_offsets.tobytes(),
+                    term_blob, postings_blob, positions_offsets.tobytes(), positions_blob):
+        sections.append(HEADER.size + len(body))
+        body += section
+        _pad(body)
+
+    flags = FLAG_POSITIONS if positions is not None else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, len(terms), len(doc_lengths), zlib.crc32(body), *sections)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(temp_path, path)
+
+
+class BinaryIndex(Mapping):
+    """
+    A read-only, memory-mapped view of a binary index file.
+
+    Behaves like the JSON inverted index (token -> list of document IDs), but postings are
+    only decoded when a term is looked up, so opening the index does not depend on its size.
+    """
+
+    def __init__(self, path, verify=False, cache_pairs=CACHE_PAIRS):
+        """
+        Open a binary index file.
+
+        :param path: Path of the binary index file.
+        :param verify: Check the CRC32 of the whole file body. This reads every page of the file.
+        :param cache_pairs: Maximum total number of decoded pairs kept in an LRU cache, so that the
+                            postings of frequent query terms are not decoded again on every lookup. 0 disables it.
+        """
+        self.path = path
+        self.cache_pairs = cache_pairs
+        self._cache = OrderedDict()  # (kind, term ID) -> decoded list, least recently used first
+        self._cached_pairs = 0
+        self._cache_lock = threading.Lock()
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER_V1.size:
+            raise IndexFormatError(f"{path} is too small to be a binary index.")
+
+        magic, version = struct.unpack_from("<4sH", self._mmap)
+        if magic != MAGIC:
+            raise IndexFormatError(f"{path} is not a binary index file.")
+        if version not in (1, VERSION):
+            raise IndexFormatError(f"Unsupported binary index version {version} in {path}.")
+        self._header = HEADER if version == VERSION else HEADER_V1
+        if len(self._mmap) < self._header.size:
+            raise IndexFormatError(f"{path} is too small to be a binary index.")
+        fields = self._header.unpack_from(self._mmap)
+        (_, _, self.flags, self.num_terms, self.num_docs, self.checksum, doc_lengths_start, term_offsets_start,
+         postings_offsets_start, self._terms_start, self._postings_start) = fields[:11]
+
+        view = memoryview(self._mmap)
+        self._view = view
+        self.doc_lengths = view[doc_lengths_start:doc_lengths_start + 4 * self.num_docs].cast("I")
+        self._term_offsets = view[term_offsets_start:term_offsets_start + 4 * (self.num_terms + 1)].cast("I")
+        self._postings_offsets = view[postings_offsets_start:postings_offsets_start + 8 * (self.num_terms + 1)].cast("Q")
+        self._positions_offsets = None
+        if self.has_positions:
+            positions_offsets_start, self._positions_start = fields[11:]
+            self._positions_offsets = view[positions_offsets_start:
+                                           positions_offsets_start + 8 * (self.num_terms + 1)].cast("Q")
+
+        if verify:
+            self.verify()
+
+    @property
+    def has_positions(self):
+        """Whether the file stores token positions (see positions_view)."""
+        return bool(self.flags & FLAG_POSITIONS)
+
+    def verify(self):
+        """Raise IndexFormatError if the stored checksum does not match the file body."""
+        if zlib.crc32(self._view[self._header.size:]) != self.checksum:
+            raise IndexFormatError(f"Checksum mismatch in {self.path}.")
+
+    def _term_bytes(self, term_id):
+        start = self._terms_start + self._term_offsets[term_id]
+        return self._mmap[start:self._terms_start + self._term_offsets[term_id + 1]]
+
+    def _find(self, term):
+        """Binary search the sorted term dictionary. Returns the term ID or -1."""
+        key = term.encode("utf-8")
+        low, high = 0, self.num_terms
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.num_terms and self._term_bytes(low) == key:
+            return low
+        return -1
+
+    def _decode_arrays(self, term_id):
+        """Return the document IDs and term frequencies of a term as two NumPy arrays."""
+        start = self._postings_start + self._postings_offsets[term_id]
+        values = decode_varints(self._view[start:self._postings_start + self._postings_offsets[term_id + 1]])
+        return np.cumsum(values[0::2]), values[1::2]  # Gaps back to document IDs
+
+    def _cached(self, key, decode):
+        """Return a decoded list of a term from the LRU cache, decoding and caching it on a miss."""
+        with self._cache_lock:
+            pairs = self._cache.get(key)
+            if pairs is not None:
+                self._cache.move_to_end(key)
+                return pairs
+        pairs = decode(key[1])
+        if len(pairs) <= self.cache_pairs:
+            with self._cache_lock:
+                if key not in self._cache:
+                    self._cache[key] = pairs
+                    self._cached_pairs += len(pairs)
+                while self._cached_pairs > self.cache_pairs:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_pairs -= len(evicted)
+        return pairs
+
+    def _decode(self, term_id):
+        return self._cached(("postings", term_id), self._decode_pairs)
+
+    def _decode_doc_ids(self, term_id):
+        return self._cached(("doc_ids", term_id), lambda term_id: self._decode_arrays(term_id)[0].tolist())
+
+    def _decode_positions(self, term_id):
+        return self._cached(("positions", term_id), self._decode_positions_pairs)
+
+    def _decode_pairs(self, term_id):
+        doc_ids, tfs = self._decode_arrays(term_id)
+        return list(zip(doc_ids.tolist(), tfs.tolist()))
+
+    def _decode_positions_pairs(self, term_id):
+        start = self._positions_start + self._positions_offsets[term_id]
+        values = decode_varints(self._view[start:self._positions_start + self._positions_offsets[term_id + 1]])
+
+        # Each document is stored as (doc ID delta, count, position deltas...). The counts equal the term
+        # frequencies of the postings, which give the layout, so all records are decoded at once.
+        counts = self._decode_arrays(term_id)[1]
+        record_starts = np.cumsum(counts + 2) - (counts + 2)
+        if len(counts) and counts.min() > 0 and int(counts.sum()) + 2 * len(counts) == len(values) and \
+                np.array_equal(values[record_starts + 1], counts):
+            is_delta = np.ones(len(values), dtype=bool)
+            is_delta[record_starts] = is_delta[record_starts + 1] = False
+            deltas = values[is_delta]
+            positions = np.cumsum(deltas)
+            ends = np.cumsum(counts)
+            firsts = ends - counts
+            positions -= np.repeat(positions[firsts] - deltas[firsts], counts)  # Restart the sum per document
+            positions = positions.tolist()
+            doc_ids = np.cumsum(values[record_starts])
+            return [(doc_id, tuple(positions[end - count:end]))
+                    for doc_id, count, end in zip(doc_ids.tolist(), counts.tolist(), ends.tolist())]
+
+        values = values.tolist()  # Walk the records one at a time
+        pairs = []
+        doc_id = i = 0
+        while i < len(values):
+            doc_id += values[i]
+            count = values[i + 1]
+            position = 0
+            doc_positions = []
+            for delta in values[i + 2:i + 2 + count]:
+                position += delta
+                doc_positions.append(position)
+            pairs.append((doc_id, tuple(doc_positions)))
+            i += 2 + count
+        return pairs
+
+    def postings(self, term):
+        """
+        Return the (document_id, term_frequency) pairs for a term, or an empty list if it is not indexed.
+        """
+        term_id = self._find(term)
+        return self._decode(term_id) if term_id >= 0 else []
+
+    def postings_view(self):
+        """Return a mapping of token -> (document_id, term_frequency) pairs backed by this file."""
+        return _PostingsView(self)
+
+    def positions_view(self):
+        """
+        Return a mapping of token -> (document_id, positions) pairs backed by this file,
+        or None if the file does not store positions.
+        """
+        return _PostingsView(self, positional=True) if self.has_positions else None
+
+    def __getitem__(self, term):
+        term_id = self._find(term)
+        if term_id < 0:
+            raise KeyError(term)
+        return self._decode_doc_ids(term_id)
+
+    def __contains__(self, term):
+        return isinstance(term, str) and self._find(term) >= 0
+
+    def __iter__(self):
+        for term_id in range(self.num_terms):
+            yield self._term_bytes(term_id).decode("utf-8")
+
+    def __len__(self):
+        return self.num_terms
+
+    def close(self):
+        """Release the memory map."""
+        self._cache.clear()
+        for view in (self.doc_lengths, self._term_offsets, self._postings_offsets, self._positions_offsets, self._view):
+            if view is not None:
+                view.release()
+        self._mmap.close()
+
+
+class _PostingsView(Mapping):
+    """Mapping of token -> (document_id, term_frequency) or (document_id, positions) pairs over a BinaryIndex."""
+
+    def __init__(self, index, positional=False):
+        self._index = index
+        self._decode = index._decode_positions if positional else index._decode
+
+    def __getitem__(self, term):
+        term_id = self._index._find(term)
+        if term_id < 0:
+            raise KeyError(term)
+        return self._decode(term_id)
+
+    def __contains__(self, term):
+        return term in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def convert_json_index(json_file, binary_file, num_docs=0):
+    """
+    Convert an inverted_index.json file (token -> repeated document IDs) to the binary format.
+
+    :param json_file: Path of the existing JSON index.
+    :param binary_file: Path of the binary index to write.
+    :param num_docs: Minimum number of documents (e.g. the number of publications), so that
+                     documents without any indexed token still get a length entry.
+    """
+    with open(json_file, "r") as f:
+        inverted_index = json.load(f)
+
+    postings = {}
+    doc_lengths = [0] * num_docs
+    for token, doc_ids in inverted_index.items():
+        postings[token] = sorted(Counter(doc_ids).items())  # Repeated IDs become term frequencies
+        for doc_id, tf in postings[token]:
+            if doc_id >= len(doc_lengths):
+                doc_lengths.extend([0] * (doc_id + 1 - len(doc_lengths)))
+            doc_lengths[doc_id] += tf
+
+    write_binary_index(binary_file, postings, doc_lengths)
+    print(f"Converted {json_file} ({len(postings)} terms) to {binary_file}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a JSON inverted index to the binary index format.")
+    parser.add_argument("json_file", help="Existing JSON index, e.g. inverted_index.json")
+    parser.add_argument("binary_file", help="Binary index to write, e.g. inverted_index.bin")
+    parser.add_argument("--num-docs", type=int, default=0, help="Number of documents in the collection")
+    args = parser.parse_args()
+
+    convert_json_index(args.json_file, args.binary_file, args.num_docs)
+    BinaryIndex(args.binary_file, verify=True).close()  # Check the written file reads back
@@ -1,56 +1,580 @@
-from collections import defaultdict
-from utils import preprocess_text
+from collections import Counter, defaultdict
+from utils import preprocess_batch, preprocess_text
+from facets import FacetIndex
+from index_store import BinaryIndex, write_binary_index
+from segments import DocumentIdView, SegmentedPostings, SegmentStore
+from vocabulary import Vocabulary
 import json
+import os
+import pickle
+import threading
 
 class Indexer:
     """
     A class to build, save, and load an inverted index for efficient text search.
     """
 
-    def __init__(self, publications, index_file="inverted_index.json"):
+    PARALLEL_THRESHOLD = 10_000  # Number of titles from which preprocessing runs in a process pool
+
+    def __init__(self, publications, index_file="inverted_index.json", tfidf_file=None, index_format=None,
+                 merge_threshold=8):
         """
         Initialize the Indexer.
 
         :param publications: List of dictionaries containing document metadata (e.g., titles).
         :param index_file: Name of the file where the inverted index will be stored.
+        :param index_format: "json" or "binary" (memory-mapped, see index_store.py).
+                             Inferred from the file extension when None (".bin" means binary).
+        :param tfidf_file: Name of the file where the precomputed TF-IDF model is stored.
+                           Defaults to a file next to the index file (e.g. inverted_index_tfidf.sav).
+        :param merge_threshold: Number of segments written by incremental updates before they are
+                                merged into the base index in the background.
         """
         self.publications = publications  # Store the list of publications
         self.index_file = index_file  # Define the index file name
+        self.index_format = index_format or ("binary" if index_file.endswith(".bin") else "json")
+        self.tfidf_file = tfidf_file or os.path.splitext(index_file)[0] + "_tfidf.sav"  # TF-IDF model file
+        self.vocabulary_file = os.path.splitext(index_file)[0] + "_vocab.npz"  # Autocomplete and spelling vocabulary
+        self.documents_file = os.path.splitext(index_file)[0] + "_documents.json"  # Publications of the base index
         self.inverted_index = defaultdict(list)  # Dictionary to store the inverted index
+        self.postings = defaultdict(list)  # Token -> list of (document ID, term frequency) pairs
+        self.positions = defaultdict(list)  # Token -> list of (document ID, token positions) pairs, or None
+        self.doc_lengths = []  # Number of title tokens per document, indexed by document ID
+        self.tfidf_vectorizer = None  # Vectorizer fitted once on the whole corpus
+        self.tfidf_matrix = None  # Sparse document-term matrix (one row per document)
+        self.vocabulary = None  # Vocabulary of the base index, written and loaded with it
+        self.segment_store = SegmentStore(os.path.splitext(index_file)[0] + "_segments")  # Incremental updates
+        self.merge_threshold = merge_threshold
+        self.version = 0  # Incremented whenever the searchable contents change
+        self._lock = threading.RLock()  # Guards incremental updates against a running merge
+        self._merge_thread = None
+        self._merge_lock = threading.Lock()  # One merge at a time, as merges write the same files
+        self._facets = None  # FacetIndex over the publications, built on first use and updated by segments
 
     def build_index(self):
         """
         Build the inverted index from the provided publications.
 
         The index maps tokens (words) to lists of document IDs containing those tokens.
+        Term-frequency postings and document lengths are built in the same pass for BM25 ranking,
+        and token positions for phrase queries.
         """
         print("Building inverted index...")
+        self.inverted_index = defaultdict(list)
+        self.postings = defaultdict(list)
+        self.positions = defaultdict(list)
+        self.doc_lengths = []
 
-        # Iterate over all publications and extract tokens from their titles
-        for doc_id, pub in enumerate(self.publications):
-            title_tokens = preprocess_text(pub["title"])  # Preprocess the title to extract tokens
+        # Iterate over all publications and extract tokens from their titles (deleted publications are None)
+        titles = (pub["title"] if pub else "" for pub in self.publications)
+        processes = None if len(self.publications) >= self.PARALLEL_THRESHOLD else 1
+        for doc_id, title_tokens in enumerate(preprocess_batch(titles, processes)):
             for token in title_tokens:
                 self.inverted_index[token].append(doc_id)  # Store document ID under the corresponding token
+            for token, token_positions in self._token_positions(title_tokens).items():
+                self.postings[token].append((doc_id, len(token_positions)))  # Store (document ID, term frequency) once per token
+                self.positions[token].append((doc_id, token_positions))
+            self.doc_lengths.append(len(title_tokens))  # Store the title length for length normalization
+
+        # Fit the corpus-wide TF-IDF model alongside the index
+        self.build_tfidf()
 
-        # Save the constructed inverted index to a file
+        # Save the constructed inverted index to a file; it replaces any incremental segments
         self.save_index()
+        self._clear_segments()
+        self._facets = None  # Rebuilt from the new publications on next use
+        self.version += 1
+
+    @staticmethod
+    def _token_positions(tokens):
+        """Return a dictionary of token -> tuple of its positions in the preprocessed token list."""
+        positions = defaultdict(list)
+        for position, token in enumerate(tokens):
+            positions[token].append(position)
+        return {token: tuple(token_positions) for token, token_positions in positions.items()}
+
+    def facet_index(self):
+        """
+        Return the author/year/journal facet index of the current publications (see facets.py).
+
+        It is built from the publications on first use, then updated with the documents of every
+        segment; a merge leaves the publications, and so the facet index, unchanged.
+        """
+        with self._lock:
+            if self._facets is None:
+                self._facets = FacetIndex(self.publications)
+            return self._facets
+
+    def build_tfidf(self):
+        """
+        Fit a TF-IDF model on all publication titles.
+
+        The document-term matrix and IDF weights are computed once for the whole corpus,
+        so query time only needs to vectorize the query itself.
+        """
+        self.tfidf_vectorizer, self.tfidf_matrix = self._fit_tfidf(self._titles(self.publications))
+
+    @staticmethod
+    def _titles(publications):
+        """Return the title of every publication, with an empty title for deleted ones."""
+        return [pub["title"] if pub else "" for pub in publications]
+
+    @staticmethod
+    def _fit_tfidf(titles):
+        """Fit a TF-IDF vectorizer on the given titles and return it with the CSR document-term matrix."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer()
+        return vectorizer, vectorizer.fit_transform(titles).tocsr()  # CSR for fast row slicing
+
+    def _update_tfidf_rows(self, doc_ids):
+        """
+        Recompute the TF-IDF rows of changed documents with the already fitted vectorizer.
+
+        New documents get new rows and deleted ones get empty rows. IDF weights are only
+        refreshed when segments are merged or the index is rebuilt.
+
+        :param doc_ids: Iterable of changed document IDs.
+        """
+        doc_ids = sorted(doc_ids)
+        if self.tfidf_matrix is None or not doc_ids:
+            return
+        import numpy as np
+        from scipy import sparse
+
+        num_docs = len(self.publications)
+        matrix = self.tfidf_matrix
+        if matrix.shape[0] < num_docs:
+            matrix = sparse.vstack([matrix, sparse.csr_matrix((num_docs - matrix.shape[0], matrix.shape[1]))])
+
+        rows = self.tfidf_vectorizer.transform(self._titles(self.publications[doc_id] for doc_id in doc_ids)).tocoo()
+        replacement = sparse.csr_matrix((rows.data, (np.asarray(doc_ids)[rows.row], rows.col)), shape=matrix.shape)
+        keep = np.ones(num_docs)
+        keep[doc_ids] = 0  # Drop the old rows of the changed documents
+        self.tfidf_matrix = (sparse.diags(keep) @ matrix + replacement).tocsr()
+        self.tfidf_matrix.eliminate_zeros()
 
     def save_index(self):
         """
-        Save the inverted index to a JSON file for later use.
+        Save the inverted index to a JSON or binary file for later use.
+
+        The precomputed TF-IDF model, if built, is saved next to it.
         """
-        with open(self.index_file, "w") as f:
-            json.dump(self.inverted_index, f, indent=4)  # Save the index in a readable JSON format
+        self.vocabulary = self._write_base(self.postings, self.doc_lengths, self.positions, self.publications)
+        if self.tfidf_matrix is not None:
+            self.save_tfidf()
         print(f"Inverted index built and saved to {self.index_file}.")
 
+    def _write_base(self, postings, doc_lengths, positions=None, publications=None, suffix=""):
+        """
+        Write postings and document lengths as the base index file in the configured format.
+
+        Token positions are only stored by the binary format; the JSON format keeps its original layout.
+        The vocabulary (see vocabulary.py) of the new base is saved next to it in both formats, and so
+        are the indexed publications when given.
+
+        :param suffix: Appended to every file name, to write a new base next to the live one (see merge_segments).
+        :return: The Vocabulary of the new base.
+        """
+        if publications is not None:
+            self._save_documents(publications, self.documents_file + suffix)
+        vocabulary = self._save_vocabulary(postings, self.vocabulary_file + suffix)
+        index_file = self.index_file + suffix
+        if self.index_format == "binary":
+            write_binary_index(index_file, postings, doc_lengths, positions)  # Compact varint postings
+        else:
+            # Repeat each document ID once per occurrence, as in the original index format
+            inverted_index = {token: [doc_id for doc_id, tf in pairs for _ in range(tf)]
+                              for token, pairs in postings.items()}
+            temp_file = index_file + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(inverted_index, f, indent=4)  # Save the index in a readable JSON format
+            os.replace(temp_file, index_file)
+        return vocabulary
+
+    def _save_documents(self, publications, path):
+        """Save the publications of the base index (None for deleted ones) to the documents file."""
+        temp_file = path + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(publications, f)
+        os.replace(temp_file, path)
+
+    def _load_documents(self):
+        """
+        Restore the publications saved with the base index into the publications list (in place).
+
+        They only fill in the entries the list does not have (past its end, or None), e.g. documents added
+        by incremental updates that an older data file lacks. Publications the caller passed in are kept,
+        since they may be newer than the index (e.g. from a crawl whose changes are applied next).
+        """
+        try:
+            with open(self.documents_file, "r") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return  # Index saved by an earlier version: the publications list is the only copy
+        for doc_id, pub in enumerate(stored):
+            if doc_id >= len(self.publications):
+                self.publications.append(pub)
+            elif self.publications[doc_id] is None:
+                self.publications[doc_id] = pub
+
+    @staticmethod
+    def _save_vocabulary(postings, path):
+        """Build the vocabulary of term -> document frequency from postings, save and return it."""
+        vocabulary = Vocabulary.build({token: len(pairs) for token, pairs in postings.items()})
+        temp_file = path + ".tmp"
+        vocabulary.save(temp_file)
+        os.replace(temp_file, path)
+        return vocabulary
+
+    def load_vocabulary(self):
+        """
+        Load the vocabulary of the base index, building it from the postings if it is missing
+        or was saved by an earlier version.
+
+        Tokens first added by incremental segments are only part of it after the next merge.
+        """
+        try:
+            self.vocabulary = Vocabulary.load(self.vocabulary_file)
+        except (FileNotFoundError, ValueError):
+            self.vocabulary = self._save_vocabulary(self.postings, self.vocabulary_file)
+
     def load_index(self):
         """
-        Load the inverted index from a JSON file.
+        Load the inverted index from a JSON or binary file.
 
         If the index file does not exist, notify the user to build the index first.
+        A binary index is memory-mapped and its postings are decoded lazily per term.
+        Token positions are only available from a binary index written with them; otherwise
+        positions is None and phrase queries re-tokenize their candidate documents.
+        The publications saved with the base index are restored, then segments written by
+        incremental updates are replayed on top of it.
+        The vocabulary is loaded from its file, or built and saved if it is missing.
+        The TF-IDF model is loaded from its file, or fitted and saved if it is missing or stale.
         """
         try:
+            self._load_base()
+        except FileNotFoundError:
+            print("No existing index found. Please build the index first.")  # Notify the user if the index is missing
+            return
+
+        self._facets = None  # Rebuilt from the loaded publications on next use
+        self._load_documents()
+        self.load_vocabulary()
+        touched = self._load_segments()
+        self.load_tfidf()
+        self._update_tfidf_rows(touched)
+        self.version += 1
+
+    def _load_base(self):
+        """
+        Load the base index file (without segments) in the configured format.
+        """
+        if self.index_format == "binary":
+            index = BinaryIndex(self.index_file)
+            self.inverted_index = index  # Token -> document IDs, decoded on lookup
+            self.postings = index.postings_view()
+            self.positions = index.positions_view()
+            self.doc_lengths = index.doc_lengths
+        else:
             with open(self.index_file, "r") as f:
                 self.inverted_index = json.load(f)  # Load the inverted index from file
+            self.build_postings()
+            self.positions = None  # Not stored in the JSON format
+
+    def build_postings(self):
+        """
+        Derive term-frequency postings and document lengths from the loaded inverted index.
+
+        The saved index repeats a document ID once per occurrence of the token,
+        so the term frequency is the number of repeats.
+        """
+        self.postings = defaultdict(list)
+        self.doc_lengths = []
+        for token, doc_ids in self.inverted_index.items():
+            for doc_id, tf in Counter(doc_ids).items():
+                self.postings[token].append((doc_id, tf))
+                if doc_id >= len(self.doc_lengths):
+                    self.doc_lengths.extend([0] * (doc_id + 1 - len(self.doc_lengths)))
+                self.doc_lengths[doc_id] += tf
+
+    def load_tfidf(self):
+        """
+        Load the precomputed TF-IDF model, rebuilding it when missing or out of date.
+        """
+        try:
+            with open(self.tfidf_file, "rb") as f:
+                tfidf = pickle.load(f)
+            self.tfidf_vectorizer, self.tfidf_matrix = tfidf["vectorizer"], tfidf["matrix"]
         except FileNotFoundError:
-            print("No existing index found. Please build the index first.")  # Notify the user if the index is missing
+            self.tfidf_matrix = None
+
+        # Refit if the model is missing or covers documents that no longer exist
+        if self.tfidf_matrix is None or self.tfidf_matrix.shape[0] > len(self.publications):
+            print("Precomputed TF-IDF model missing or stale. Rebuilding...")
+            self.build_tfidf()
+            self.save_tfidf()
+        elif self.tfidf_matrix.shape[0] < len(self.publications):
+            # Publications appended since the model was fitted only need their own rows
+            self._update_tfidf_rows(range(self.tfidf_matrix.shape[0], len(self.publications)))
+
+    def save_tfidf(self):
+        """
+        Save the fitted TF-IDF vectorizer and document-term matrix next to the index file.
+        """
+        temp_file = self.tfidf_file + ".tmp"
+        with open(temp_file, "wb") as f:
+            pickle.dump({"vectorizer": self.tfidf_vectorizer, "matrix": self.tfidf_matrix}, f)
+        os.replace(temp_file, self.tfidf_file)
+
+    def add_documents(self, publications):
+        """
+        Append new publications and index them without rebuilding the index.
+
+        :param publications: List of publication dictionaries to add.
+        :return: List of the document IDs assigned to the new publications.
+        """
+        with self._lock:
+            start = len(self.publications)
+            self.publications.extend(publications)
+            doc_ids = list(range(start, len(self.publications)))
+            self._apply_changes({doc_id: self.publications[doc_id] for doc_id in doc_ids})
+        return doc_ids
+
+    def update_document(self, doc_id, publication):
+        """
+        Replace a publication and re-index it without rebuilding the index.
+
+        :param doc_id: ID of the document to replace.
+        :param publication: New publication dictionary.
+        """
+        with self._lock:
+            self.publications[doc_id] = publication
+            self._apply_changes({doc_id: publication})
+
+    def delete_document(self, doc_id):
+        """
+        Remove a publication from the index.
+
+        Document IDs are positions in the publications list, so the entry is replaced by None
+        rather than removed, and a tombstone hides its postings from every search.
+
+        :param doc_id: ID of the document to delete.
+        """
+        with self._lock:
+            self.publications[doc_id] = None
+            self._apply_changes({doc_id: None})
+
+    def sync_publications(self):
+        """
+        Index publications appended to the shared publications list since the index was built,
+        e.g. by a re-crawl.
+
+        :return: List of the newly indexed document IDs.
+        """
+        with self._lock:
+            doc_ids = [doc_id for doc_id in range(len(self.doc_lengths), len(self.publications))
+                       if self.publications[doc_id] is not None]
+            if doc_ids:
+                self._apply_changes({doc_id: self.publications[doc_id] for doc_id in doc_ids})
+        return doc_ids
+
+    def apply_crawl_changes(self, changes):
+        """
+        Index the publications changed by a crawl (see Crawler.crawl_publications) in one segment.
+
+        :param changes: Dictionary with the document IDs of "added", "changed" and "removed" publications.
+        """
+        with self._lock:
+            documents = {doc_id: self.publications[doc_id] for doc_id in changes["added"] + changes["changed"]}
+            documents.update({doc_id: None for doc_id in changes["removed"]})
+            if documents:
+                self._apply_changes(documents)
+
+    def _apply_changes(self, documents):
+        """
+        Write one immutable segment for a batch of changes and apply it to the live index.
+
+        :param documents: Dictionary of document ID -> publication, or None for a deletion.
+        """
+        manifest = self.segment_store.read_manifest()
+        segment = {
+            "generation": manifest["next_generation"],
+            "postings": defaultdict(list),
+            "positions": defaultdict(list),
+            "doc_lengths": {},
+            "documents": {doc_id: pub for doc_id, pub in documents.items() if pub is not None},
+            "tombstones": sorted(documents),  # Hide older postings of every touched document
+        }
+        for doc_id, pub in sorted(segment["documents"].items()):
+            title_tokens = preprocess_text(pub["title"])
+            for token, token_positions in self._token_positions(title_tokens).items():
+                segment["postings"][token].append((doc_id, len(token_positions)))
+                segment["positions"][token].append((doc_id, token_positions))
+            segment["doc_lengths"][doc_id] = len(title_tokens)
+        for doc_id in documents:
+            segment["doc_lengths"].setdefault(doc_id, 0)  # Deleted documents no longer count towards BM25 statistics
+
+        manifest["segments"].append(self.segment_store.write_segment(segment))
+        manifest["next_generation"] += 1
+        self.segment_store.write_manifest(manifest)
+
+        self._apply_segment(segment)
+        self._update_tfidf_rows(documents)
+        self.version += 1
+        print(f"Indexed {len(documents)} changed documents into segment {segment['generation']}.")
+
+        # Merge early when the segment adds words, which otherwise score 0.0 under TF-IDF until the next merge
+        if (len(manifest["segments"]) >= self.merge_threshold
+                or self._has_unseen_words(segment["documents"].values())):
+            self.merge_segments(background=True)
+
+    def _apply_segment(self, segment):
+        """
+        Stack a segment on the in-memory index: postings, positions, document lengths and stored publications.
+        """
+        if not isinstance(self.postings, SegmentedPostings):
+            manifest = self.segment_store.read_manifest()
+            self.postings = SegmentedPostings(self.postings, manifest["base_generation"])
+            self.inverted_index = DocumentIdView(self.postings)
+            self.doc_lengths = list(self.doc_lengths)  # Mutable copy (the binary index is read-only)
+            if self.positions is not None:
+                self.positions = SegmentedPostings(self.positions, manifest["base_generation"])
+        self.postings.add_segment(segment)
+        if self.positions is not None:
+            if "positions" in segment:
+                self.positions.add_segment({"generation": segment["generation"], "postings": segment["positions"],
+                                            "tombstones": segment["tombstones"]})
+            else:
+                self.positions = None  # Segment written without positions
+
+        for doc_id, length in segment["doc_lengths"].items():
+            if doc_id >= len(self.doc_lengths):
+                self.doc_lengths.extend([0] * (doc_id + 1 - len(self.doc_lengths)))
+            self.doc_lengths[doc_id] = length
+        for doc_id in segment["tombstones"]:
+            if doc_id >= len(self.publications):
+                self.publications.extend([None] * (doc_id + 1 - len(self.publications)))
+            self.publications[doc_id] = segment["documents"].get(doc_id)  # None for deletions
+        if self._facets is not None:
+            self._facets = self._facets.updated({doc_id: self.publications[doc_id] for doc_id in segment["tombstones"]})
+
+    def _load_segments(self):
+        """
+        Replay the segments listed in the manifest on top of the loaded base index.
+
+        :return: Set of document IDs touched by the segments.
+        """
+        touched = set()
+        for name in self.segment_store.read_manifest()["segments"]:
+            segment = self.segment_store.read_segment(name)
+            self._apply_segment(segment)
+            touched.update(segment["tombstones"])
+        return touched
+
+    def _clear_segments(self):
+        """
+        Start a new, empty segment list on top of a freshly written base index.
+        """
+        manifest = self.segment_store.read_manifest()
+        old_segments = manifest["segments"]
+        manifest["base_generation"] = manifest["next_generation"] - 1
+        manifest["segments"] = []
+        if old_segments or os.path.exists(self.segment_store.manifest_file):
+            self.segment_store.write_manifest(manifest)
+        for name in old_segments:
+            self.segment_store.remove_segment(name)
+
+    def merge_segments(self, background=False):
+        """
+        Merge all segments and tombstones into a new base index file.
+
+        Updates made while a background merge runs are written as new segments and stay
+        on top of the merged base. The TF-IDF model is refitted as part of the merge.
+        Segments are the only saved copy of added and updated publications, so the merged
+        publications are saved with the new base (see documents_file) before the segments are removed.
+
+        :param background: Run the merge in a background thread and return immediately.
+        """
+        if background:
+            if self._merge_thread is None or not self._merge_thread.is_alive():
+                self._merge_thread = threading.Thread(target=self.merge_segments, daemon=True)
+                self._merge_thread.start()
+            return
+
+        with self._merge_lock:
+            self._merge_segments()
+
+    def _merge_segments(self):
+        """Merge the segments listed in the manifest now (see merge_segments)."""
+        with self._lock:
+            manifest = self.segment_store.read_manifest()
+            if not manifest["segments"]:
+                return
+            merged = list(manifest["segments"])
+            merged_generation = manifest["next_generation"] - 1
+            postings = {token: self.postings[token] for token in self.postings}  # Snapshot of the live view
+            postings = {token: pairs for token, pairs in postings.items() if pairs}
+            positions = None
+            if self.positions is not None:
+                positions = {token: self.positions[token] for token in self.positions}
+                positions = {token: pairs for token, pairs in positions.items() if pairs}
+            doc_lengths = list(self.doc_lengths)
+            publications = list(self.publications)
+            titles = self._titles(publications)
+
+        # Writing the new base next to the live one and refitting TF-IDF happen outside the lock
+        vocabulary = self._write_base(postings, doc_lengths, positions, publications, suffix=".merge")
+        tfidf_vectorizer, tfidf_matrix = self._fit_tfidf(titles)
+
+        with self._lock:
+            # Swap the files and the in-memory base together, so searches never see half of each
+            for path in (self.documents_file, self.vocabulary_file, self.index_file):
+                os.replace(path + ".merge", path)
+            self.vocabulary = vocabulary
+            manifest = self.segment_store.read_manifest()
+            manifest["base_generation"] = merged_generation
+            manifest["segments"] = [name for name in manifest["segments"] if name not in merged]
+            self.segment_store.write_manifest(manifest)
+
+            # Restack the segments written during the merge on the new base
+            if self.index_format == "binary":
+                self._load_base()  # Map the new file instead of keeping the snapshot in memory
+            else:
+                self.postings = postings
+                self.positions = positions
+                self.inverted_index = DocumentIdView(postings)
+                self.doc_lengths = doc_lengths
+            pending = [self.segment_store.read_segment(name) for name in manifest["segments"]]
+            for segment in pending:
+                self._apply_segment(segment)
+
+            self.tfidf_vectorizer, self.tfidf_matrix = tfidf_vectorizer, tfidf_matrix
+            self._update_tfidf_rows({doc_id for segment in pending for doc_id in segment["tombstones"]})
+            self.save_tfidf()
+            self.version += 1
+
+        for name in merged:
+            self.segment_store.remove_segment(name)
+        print(f"Merged {len(merged)} segments into {self.index_file}.")
+
+        # Segments written during the merge may still hold words the refitted TF-IDF model lacks
+        if any(self._has_unseen_words(segment["documents"].values()) for segment in pending):
+            self._merge_segments()
+
+    def _has_unseen_words(self, publications):
+        """
+        Check whether any title has words the fitted TF-IDF vectorizer does not know.
+
+        Such words get no TF-IDF weight until the vectorizer is refitted by a merge.
+        """
+        if self.tfidf_vectorizer is None:
+            return False
+        analyzer = self.tfidf_vectorizer.build_analyzer()
+        vocabulary = self.tfidf_vectorizer.vocabulary_
+        return any(word not in vocabulary for title in self._titles(publications) for word in analyzer(title))
+
+    def wait_for_merge(self):
+        """Block until a running background merge has finished."""
+        if self._merge_thread is not None:
+            self._merge_thread.join()
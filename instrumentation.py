@@ -0,0 +1,246 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+
+# Lightweight per-stage instrumentation for search and classification.
+#
+#   with instrumentation.request("search", query=query):   # One trace per user request
+#       with instrumentation.span("search.parse"):          # Timed stage
+#           ...
+#       instrumentation.count("search.candidates", n)     # Counter
+#
+# Disabled by default (set SEARCH_INSTRUMENTATION=1 or call enable()); a single request can opt in with
+# request(..., traced=True), which traces only that request's thread. When disabled, span() returns a
+# shared no-op context manager and count() returns immediately, so the hooks can stay in hot paths.
+
+logger = logging.getLogger("search_engine.instrumentation")
+
+HISTORY_SIZE = 1000  # Recent durations kept per span for percentiles
+RECENT_REQUESTS = 20  # Recent request traces kept for snapshot() and the debug panel
+PROFILERS = ("cprofile", "sampling")
+
+_enabled = os.environ.get("SEARCH_INSTRUMENTATION") == "1"
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_local = threading.local()  # Trace of the request running in this thread
+_spans = {}  # Span name -> [count, total seconds, max seconds, recent durations]
+_counters = Counter()
+_recent = deque(maxlen=RECENT_REQUESTS)
+
+
+def enable(log_file=None):
+    """
+    Turn instrumentation on.
+
+    :param log_file: Optional file receiving one JSON line per finished request.
+    """
+    global _enabled
+    _enabled = True
+    if log_file and not any(getattr(handler, "baseFilename", None) == os.path.abspath(log_file)
+                            for handler in logger.handlers):
+        logger.addHandler(logging.FileHandler(log_file))
+        logger.setLevel(logging.INFO)
+
+
+def disable():
+    """Turn instrumentation off; recorded metrics are kept until reset()."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Clear all recorded spans, counters and request traces."""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _recent.clear()
+
+
+class _Span:
+    """Context manager timing one stage, recorded globally and in the current request trace."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        with _lock:
+            stats = _spans.get(self.name)
+            if stats is None:
+                stats = _spans[self.name] = [0, 0.0, 0.0, deque(maxlen=HISTORY_SIZE)]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3].append(seconds)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.depth -= 1
+            trace.spans.append({"name": self.name, "ms": round(seconds * 1000, 3), "depth": trace.depth})
+        return False
+
+
+def span(name):
+    """
+    Time the wrapped block under the given stage name.
+
+    :param name: Stage name, e.g. "search.candidates".
+    """
+    if not _enabled and getattr(_local, "trace", None) is None:
+        return _NOOP
+    return _Span(name)
+
+
+def count(name, value=1):
+    """
+    Add to a counter, e.g. the candidate-set size or the number of postings scanned.
+    """
+    if not _enabled and getattr(_local, "trace", None) is None:
+        return
+    with _lock:
+        _counters[name] += value
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.counters[name] += value
+
+
+class Trace:
+    """Spans, counters and optional profile of a single request."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.spans = []  # In completion order; depth gives the nesting
+        self.counters = Counter()
+        self.depth = 0
+        self.seconds = None
+        self.profile = None  # Profiler report text, if profiling was requested
+
+    def as_dict(self):
+        return {"request": self.name, **self.fields, "ms": round(self.seconds * 1000, 3),
+                "spans": self.spans, "counters": dict(self.counters), "profile": self.profile}
+
+
+class _Sampler(threading.Thread):
+    """Sampling profiler: records the innermost frames of one thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval=0.002):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                code = frame.f_code
+                self.samples[f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"] += 1
+
+    def report(self, limit=25):
+        total = sum(self.samples.values()) or 1
+        return "\n".join(f"{count:6d} {100 * count / total:5.1f}%  {frame}"
+                         for frame, count in self.samples.most_common(limit))
+
+
+def _start_profiler(profile):
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if profile == "sampling":
+        sampler = _Sampler(threading.get_ident())
+        sampler.start()
+        return sampler
+    if profile is not None:
+        raise ValueError(f"Unknown profiler: {profile}")
+    return None
+
+
+def _stop_profiler(profiler, limit=25):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+    if isinstance(profiler, _Sampler):
+        profiler.stopped.set()
+        profiler.join()
+        return profiler.report(limit)
+    return None
+
+
+@contextmanager
+def request(name, profile=None, traced=False, **fields):
+    """
+    Trace one request (a search or a classification) and log it as a JSON line when it ends.
+
+    Nested requests are recorded as spans of the outer one.
+
+    :param name: Request type, e.g. "search" or "classify".
+    :param profile: Optional per-request profiler: "cprofile" or "sampling".
+    :param traced: Trace this request even while instrumentation is disabled, e.g. for the user whose
+                   debug panel is open. Only spans and counters of this request's thread are recorded.
+    :param fields: Extra fields for the log record, e.g. the query.
+    :return: The Trace, or None when the request is not traced.
+    """
+    if not (_enabled or traced) or getattr(_local, "trace", None) is not None:
+        with span(name):
+            yield None
+        return
+
+    trace = Trace(name, fields)
+    _local.trace = trace
+    profiler = _start_profiler(profile)
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield trace
+    finally:
+        trace.seconds = time.perf_counter() - start
+        trace.profile = _stop_profiler(profiler)
+        _local.trace = None
+        record = trace.as_dict()
+        with _lock:
+            _recent.append(record)
+        logger.info(json.dumps(record, default=str))
+
+
+def snapshot():
+    """
+    Return the recorded metrics: per-span count and latency statistics, counters and recent requests.
+    """
+    with _lock:
+        spans = {}
+        for name, (calls, total, maximum, recent) in sorted(_spans.items()):
+            ordered = sorted(recent)
+            spans[name] = {
+                "count": calls,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / calls * 1000, 3),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(maximum * 1000, 3),
+            }
+        return {"enabled": _enabled, "spans": spans, "counters": dict(_counters), "recent_requests": list(_recent)}
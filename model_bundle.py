@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import pickle
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+FORMAT = "subject-classifier-bundle"
+VERSION = 2  # Version 1 stored the vocabulary as a fixed-width string array
+METADATA_FILE = "metadata.json"
+BUNDLE_DIR = "text_clf_bundle"
+
+
+class BundleError(ValueError):
+    """Raised when a model bundle is missing, of an unsupported version, or inconsistent."""
+
+
+def _term_hash(term):
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _vocabulary_arrays(terms):
+    """
+    Return the bundle arrays of a vocabulary given in column order: the UTF-8 terms in one blob with
+    offsets, and their CRC32 hashes sorted for lookups, with the column of each hash.
+    """
+    encoded = [term.encode("utf-8") for term in terms]
+    hashes = np.array([zlib.crc32(term) for term in encoded], dtype=np.uint32)
+    order = np.argsort(hashes, kind="stable")
+    return {
+        "term_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "term_offsets": np.concatenate([[0], np.cumsum([len(term) for term in encoded])]).astype(np.int64),
+        "term_hashes": hashes[order],
+        "hash_columns": order.astype(np.int32),
+    }
+
+
+def save_bundle(model, vectorizer, directory=BUNDLE_DIR):
+    """
+    Export a fitted MultinomialNB and its TfidfVectorizer or HashingVectorizer as a model bundle.
+
+    The bundle is a directory with a small metadata.json header and plain .npy arrays:
+    the sorted vocabulary (a UTF-8 blob with offsets, plus hashes for lookups), IDF weights and the
+    NB log-probabilities (columns in vocabulary order).
+
+    :param model: Fitted sklearn MultinomialNB.
+    :param vectorizer: Fitted sklearn TfidfVectorizer, or a HashingVectorizer.
+    :param directory: Bundle directory to write.
+    """
+    kind = type(vectorizer).__name__
+    if kind not in ("TfidfVectorizer", "HashingVectorizer"):
+        raise BundleError(f"Unsupported vectorizer: {kind}")
+    if (vectorizer.analyzer != "word" or vectorizer.ngram_range != (1, 1) or vectorizer.tokenizer is not None
+            or vectorizer.preprocessor is not None or vectorizer.strip_accents is not None
+            or vectorizer.stop_words is not None or vectorizer.binary):
+        raise BundleError("Only word unigram vectorizers with the default tokenizer can be bundled.")
+
+    config = {
+        "kind": "tfidf" if kind == "TfidfVectorizer" else "hashing",
+        "lowercase": vectorizer.lowercase,
+        "token_pattern": vectorizer.token_pattern,
+        "norm": vectorizer.norm,
+    }
+    arrays = {
+        "class_log_prior": np.asarray(model.class_log_prior_, dtype=np.float64),
+        "feature_log_prob": np.asarray(model.feature_log_prob_, dtype=np.float64),
+    }
+    if config["kind"] == "tfidf":
+        terms = sorted(vectorizer.vocabulary_)
+        columns = np.array([vectorizer.vocabulary_[term] for term in terms])
+        arrays.update(_vocabulary_arrays(terms))
+        arrays["feature_log_prob"] = np.ascontiguousarray(arrays["feature_log_prob"][:, columns])
+        config.update(use_idf=vectorizer.use_idf, sublinear_tf=vectorizer.sublinear_tf)
+        if vectorizer.use_idf:
+            arrays["idf"] = np.asarray(vectorizer.idf_, dtype=np.float64)[columns]
+    else:
+        if vectorizer.alternate_sign:
+            raise BundleError("HashingVectorizer with alternate_sign=True gives negative features; not supported.")
+        config["n_features"] = vectorizer.n_features
+
+    metadata = {
+        "format": FORMAT,
+        "version": VERSION,
+        "classes": [str(label) for label in model.classes_],
+        "n_features": int(arrays["feature_log_prob"].shape[1]),
+        "vectorizer": config,
+        "arrays": {name: {"shape": list(array.shape), "dtype": array.dtype.str} for name, array in arrays.items()},
+    }
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+    with open(os.path.join(directory, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=4)  # Written last: a bundle without it is incomplete
+
+
+class ModelBundle:
+    """
+    A subject classifier loaded from a model bundle, without scikit-learn or pickle.
+
+    Arrays are memory-mapped, so worker processes loading the same bundle share its pages
+    and loading takes the same time whatever the vocabulary size.
+    """
+
+    def __init__(self, metadata, arrays):
+        self.metadata = metadata
+        self.config = metadata["vectorizer"]
+        self.classes_ = np.array(metadata["classes"])
+        self.class_log_prior = arrays["class_log_prior"]
+        self.feature_log_prob = arrays["feature_log_prob"]
+        self.term_blob = arrays.get("term_blob")
+        self.term_offsets = arrays.get("term_offsets")
+        self.term_hashes = arrays.get("term_hashes")  # Sorted CRC32 of every term
+        self.hash_columns = arrays.get("hash_columns")  # Column of each sorted hash
+        self.idf = arrays.get("idf")
+        self.token_pattern = re.compile(self.config["token_pattern"])
+
+    @classmethod
+    def load(cls, directory=BUNDLE_DIR, mmap=True):
+        """
+        Load and validate a model bundle.
+
+        :param directory: Bundle directory.
+        :param mmap: Memory-map the arrays instead of reading them into memory.
+        :raises BundleError: If the bundle is missing, of another format version, or its arrays
+                             do not match the metadata.
+        """
+        try:
+            with open(os.path.join(directory, METADATA_FILE), "r") as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            raise BundleError(f"No model bundle found in {directory}.")
+        if metadata.get("format") != FORMAT or metadata.get("version") not in (1, VERSION):
+            raise BundleError(f"Unsupported model bundle {metadata.get('format')} v{metadata.get('version')}.")
+
+        arrays = {}
+        for name, spec in metadata["arrays"].items():
+            array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            if list(array.shape) != spec["shape"] or array.dtype.str != spec["dtype"]:
+                raise BundleError(f"Array {name} does not match the bundle metadata.")
+            arrays[name] = array
+        if "terms" in arrays:  # Version 1: convert the fixed-width string array in memory
+            arrays.update(_vocabulary_arrays(arrays.pop("terms").tolist()))
+
+        n_classes, n_features = len(metadata["classes"]), metadata["n_features"]
+        if arrays["feature_log_prob"].shape != (n_classes, n_features) or arrays["class_log_prior"].shape != (n_classes,):
+            raise BundleError("Model arrays do not match the number of classes and features.")
+        if metadata["vectorizer"]["kind"] == "tfidf" and not (
+                arrays["term_offsets"].shape == (n_features + 1,) == (arrays["term_hashes"].shape[0] + 1,)
+                and arrays["term_offsets"][-1] == len(arrays["term_blob"])):
+            raise BundleError("Vocabulary size does not match the number of features.")
+        return cls(metadata, arrays)
+
+    def _term_columns(self, tokens):
+        """Return the vocabulary column of each token, or -1 for tokens outside the vocabulary."""
+        hashes = np.fromiter((_term_hash(token) for token in tokens), dtype=np.uint32, count=len(tokens))
+        starts = np.searchsorted(self.term_hashes, hashes, side="left")
+        ends = np.searchsorted(self.term_hashes, hashes, side="right")
+        columns = np.full(len(tokens), -1, dtype=np.int64)
+        for i in np.flatnonzero(ends > starts):
+            key = tokens[i].encode("utf-8")
+            for column in self.hash_columns[starts[i]:ends[i]]:  # Usually one; more on a hash collision
+                if self.term_blob[self.term_offsets[column]:self.term_offsets[column + 1]].tobytes() == key:
+                    columns[i] = column
+                    break
+        return columns
+
+    def _tokenize(self, text):
+        if self.config["lowercase"]:
+            text = text.lower()
+        return self.token_pattern.findall(text)
+
+    def transform(self, texts):
+        """
+        Vectorize texts exactly like the bundled vectorizer.
+
+        :param texts: List of preprocessed texts.
+        :return: CSR matrix of shape (len(texts), n_features).
+        """
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(self._tokenize(text))
+            if not counts:
+                continue
+            tokens = list(counts)
+            if self.config["kind"] == "tfidf":
+                positions = self._term_columns(tokens)
+                known = positions >= 0
+                token_columns = positions[known]
+                token_counts = np.array([counts[token] for token in tokens], dtype=np.float64)[known]
+            else:
+                from sklearn.utils import murmurhash3_32  # Same hash as HashingVectorizer
+                token_columns = np.array([abs(murmurhash3_32(token, seed=0)) % self.config["n_features"]
+                                          for token in tokens])
+                token_counts = np.array([counts[token] for token in tokens], dtype=np.float64)
+            rows.append(np.full(len(token_columns), row))
+            columns.append(token_columns)
+            values.append(token_counts)
+
+        shape = (len(texts), self.metadata["n_features"])
+        if not rows:
+            return sparse.csr_matrix(shape)
+        matrix = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                   shape=shape)  # Duplicate hashed columns are summed
+        if self.config["kind"] == "tfidf":
+            if self.config["sublinear_tf"]:
+                matrix.data = np.log(matrix.data) + 1
+            if self.config["use_idf"]:
+                matrix = matrix.multiply(self.idf).tocsr()
+        if self.config["norm"] == "l2":
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        elif self.config["norm"] == "l1":
+            norms = np.asarray(abs(matrix).sum(axis=1)).ravel()
+        else:
+            return matrix
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+    def predict_log_proba(self, X):
+        """Return the normalized class log-probabilities for a vectorized batch."""
+        joint = X @ self.feature_log_prob.T + self.class_log_prior
+        maximum = joint.max(axis=1, keepdims=True)
+        return joint - (maximum + np.log(np.exp(joint - maximum).sum(axis=1, keepdims=True)))
+
+    def predict_proba(self, X):
+        """Return class probabilities for a vectorized batch (columns follow classes_)."""
+        return np.exp(self.predict_log_proba(X))
+
+    def predict(self, X):
+        """Return the most likely class label for each row of a vectorized batch."""
+        joint = X @ self.feature_log_prob.T + self.class_log_prior
+        return self.classes_[np.asarray(joint).argmax(axis=1)]
+
+
+def convert_pickles(model_file, vectorizer_file, directory=BUNDLE_DIR):
+    """
+    Convert the pickled classifier and vectorizer (.sav files) into a model bundle.
+    """
+    with open(model_file, 'rb') as f:
+        model = pickle.load(f)
+    with open(vectorizer_file, 'rb') as f:
+        vectorizer = pickle.load(f)
+    save_bundle(model, vectorizer, directory)
+    print(f"Model bundle written to {directory}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the pickled subject classifier into a model bundle.")
+    parser.add_argument("--model", default="text_clf.sav", help="Pickled MultinomialNB")
+    parser.add_argument("--vectorizer", default="text__vectorizer.sav", help="Pickled vectorizer")
+    parser.add_argument("--output", default=BUNDLE_DIR, help="Bundle directory to write")
+    args = parser.parse_args()
+
+    convert_pickles(args.model, args.vectorizer, args.output)
+    ModelBundle.load(args.output)  # Validate the written bundle
@@ -1,66 +1,133 @@
-import re
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from multiprocessing import Pool
+
 import numpy as np
 import pandas as pd
 
-import nltk
-from nltk.tokenize import WhitespaceTokenizer
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-
-from sklearn.feature_extraction.text import TfidfVectorizer
-
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 
-from sklearn.metrics import accuracy_score, confusion_matrix
-
-import pickle
-
-# Reading dataset from a CSV file
-dataset = pd.read_csv('./dataset/nyt_article_data.csv', sep='\t')
-
-# Merging the title and snippet into a single text column for processing
-dataset['Text'] = dataset['Title'] + ' ' + dataset['Snippet']
-
-# Replacing non-alphabetical characters with whitespace to clean the text
-dataset['Text'] = dataset['Text'].str.replace('[^a-zA-Z]', ' ')
-
-# Converting all text to lowercase to maintain uniformity
-dataset['Text'] = [word.lower() for word in dataset['Text']]
-
-# Applying tokenization to split text into individual words
-dataset['Text'] = dataset['Text'].apply(nltk.tokenize.WhitespaceTokenizer().tokenize)
-
-# Removing common stopwords (e.g., "the", "is", "and") to focus on meaningful words
-dataset['Text'] = dataset['Text'].apply(lambda words: [word for word in words if not word in stopwords.words('english')])
-
-# Initializing the WordNet lemmatizer for stemming words to their base forms
-lemmatizer = WordNetLemmatizer()
-
-def lemmatize_text(text):
-    # Lemmatizing words in the text to their base forms (e.g., "running" -> "run")
-    return (lemmatizer.lemmatize(word) for word in text)
-
-# Applying lemmatization to the text dataset
-dataset['Text'] = dataset['Text'].apply(lemmatize_text)
-
-# Creating a new column 'lematized_title' by joining the lemmatized words into a string
-dataset['lematized_title'] = dataset['Text'].apply(lambda words: ' '.join(words))
-
-# Preparing training data and target labels
-train_data = dataset['lematized_title'].values
-target = dataset['Category'].values
-
-# Converting text data into numerical representations using TF-IDF Vectorization
-vectorizer = TfidfVectorizer()
-X_train = vectorizer.fit_transform(train_data)
-Y_train = target
-
-# Initializing and training a Naive Bayes classifier on the processed text data
-naive_clf = MultinomialNB()
-naive_clf.fit(X_train, Y_train)
-
-# Saving the trained model and vectorizer to disk using pickle for future use
-pickle.dump(naive_clf, open('text_clf.sav', 'wb'))
-pickle.dump(vectorizer, open('text__vectorizer.sav', 'wb'))
+from model_bundle import BUNDLE_DIR, save_bundle
+from utils import get_stop_words, lemmatize, peak_memory_mb
 
+DATASET_FILE = './dataset/nyt_article_data.csv'
+MODEL_BUNDLE = BUNDLE_DIR
 
+
+@contextmanager
+def stage(name):
+    """Print the wall time of a training stage and the peak memory reached so far."""
+    start = time.perf_counter()
+    yield
+    peak = peak_memory_mb()
+    print(f"{name:<24} {time.perf_counter() - start:8.2f} s   peak memory {peak:8.1f} MB" if peak is not None
+          else f"{name:<24} {time.perf_counter() - start:8.2f} s")
+
+
+def preprocess(text):
+    # Converting to lowercase and splitting on whitespace. Punctuation is kept, as in the original
+    # pandas pipeline (str.replace('[^a-zA-Z]', ' ') matched the pattern literally); the vectorizer's
+    # tokenizer drops it later
+    words = text.lower().split()
+
+    # Removing common stopwords (e.g., "the", "is", "and"); the stopword set is built only once
+    stop_words = get_stop_words()
+
+    # Lemmatizing words to their base forms (e.g., "running" -> "run"), with cached lemmas
+    return ' '.join(lemmatize(word) for word in words if word not in stop_words)
+
+
+def read_chunks(path, chunksize):
+    """
+    Stream the dataset in chunks, yielding (texts, categories) per chunk.
+
+    The title and snippet are merged into a single text.
+    """
+    for chunk in pd.read_csv(path, sep='\t', chunksize=chunksize):
+        texts = chunk['Title'].fillna('') + ' ' + chunk['Snippet'].fillna('')
+        yield texts.tolist(), chunk['Category'].values
+
+
+def preprocess_chunks(chunks, pool):
+    """Preprocess the texts of each chunk, in parallel when a pool is given."""
+    for texts, categories in chunks:
+        if pool is None:
+            yield [preprocess(text) for text in texts], categories
+        else:
+            yield pool.map(preprocess, texts, chunksize=256), categories
+
+
+def train_in_memory(path, chunksize, pool):
+    """
+    Fit a TF-IDF vectorizer and Multinomial NB on the whole dataset at once (the original model).
+    """
+    with stage("read + preprocess"):
+        train_data, target = [], []
+        for texts, categories in preprocess_chunks(read_chunks(path, chunksize), pool):
+            train_data.extend(texts)
+            target.extend(categories)
+
+    with stage("vectorize (TF-IDF)"):
+        vectorizer = TfidfVectorizer()
+        X_train = vectorizer.fit_transform(train_data)
+
+    with stage("fit MultinomialNB"):
+        naive_clf = MultinomialNB()
+        naive_clf.fit(X_train, np.asarray(target))
+
+    return naive_clf, vectorizer
+
+
+def train_out_of_core(path, chunksize, pool, n_features):
+    """
+    Train incrementally, one chunk at a time, so memory depends on the chunk size rather than the dataset.
+
+    A stateless hashing vectorizer needs no vocabulary pass, and MultinomialNB.partial_fit updates
+    the class counts chunk by chunk.
+    """
+    with stage("collect classes"):
+        classes = np.unique(np.concatenate([chunk['Category'].dropna().unique() for chunk in
+                                            pd.read_csv(path, sep='\t', usecols=['Category'], chunksize=chunksize)]))
+
+    # Non-negative features, as required by Multinomial NB
+    vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
+    naive_clf = MultinomialNB()
+    with stage("stream + partial_fit"):
+        for texts, categories in preprocess_chunks(read_chunks(path, chunksize), pool):
+            naive_clf.partial_fit(vectorizer.transform(texts), categories, classes=classes)
+
+    return naive_clf, vectorizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the subject classifier (Business, Health, Politics).")
+    parser.add_argument("--dataset", default=DATASET_FILE, help="Tab-separated file with Title, Snippet and Category")
+    parser.add_argument("--chunksize", type=int, default=10_000, help="Rows read per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Preprocessing processes (1 = no pool)")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Stream the dataset with a hashing vectorizer and partial_fit instead of loading it all")
+    parser.add_argument("--n-features", type=int, default=2 ** 20, help="Hashing vectorizer size (out-of-core mode)")
+    args = parser.parse_args()
+
+    pool = Pool(args.workers) if args.workers > 1 else None
+    try:
+        with stage("total"):
+            if args.out_of_core:
+                naive_clf, vectorizer = train_out_of_core(args.dataset, args.chunksize, pool, args.n_features)
+            else:
+                naive_clf, vectorizer = train_in_memory(args.dataset, args.chunksize, pool)
+
+            # Saving the trained model and vectorizer as a versioned bundle of plain arrays
+            with stage("save"):
+                save_bundle(naive_clf, vectorizer, MODEL_BUNDLE)
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    A bounded LRU cache with optional time-to-live, tied to an index version.
+
+    Entries are dropped as soon as a lookup or insert sees a different index version,
+    so results computed against an older index are never served. The cache is thread-safe,
+    as the app shares one QueryProcessor (and its caches) across sessions.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        Initialize the QueryCache.
+
+        :param maxsize: Maximum number of entries. 0 disables caching.
+        :param ttl: Optional lifetime of an entry in seconds. Entries never expire when None.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None  # Index version the cached entries belong to
+        self._entries = OrderedDict()  # Key -> (insert time, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # Entries dropped because the cache was full
+        self.expirations = 0  # Entries dropped because their TTL passed
+        self.invalidations = 0  # Times the cache was cleared because the index version changed
+        self._lock = threading.Lock()  # Guards the entries and counters against concurrent sessions
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self.version = version
+
+    def get(self, key, version=None):
+        """
+        Return the cached value for a key, or None if it is missing, expired or stale.
+
+        :param key: Hashable cache key.
+        :param version: Current index version.
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)  # Mark as most recently used
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, version=None):
+        """
+        Store a value, evicting the least recently used entry if the cache is full.
+
+        :param key: Hashable cache key.
+        :param value: Value to cache (must not be None).
+        :param version: Index version the value was computed against.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return the cache counters as a dictionary.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "version": self.version,
+            }
@@ -1,40 +1,219 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import re
+import numpy as np
+import instrumentation
 from utils import preprocess_text
+from bm25 import BM25Ranker
+from boolean_query import (And, Not, Or, Phrase, QueryParser, Term, contains_phrase, difference, intersect_all,
+                           query_key, scoring_terms, union_all)
+from query_cache import QueryCache
+from segments import DocumentIdView
 
 class QueryProcessor:
     """
-    A class to process search queries using an inverted index and rank relevant documents using TF-IDF and cosine similarity.
+    A class to process search queries using an inverted index and rank relevant documents using TF-IDF and cosine similarity,
+    or BM25 over term-frequency postings.
+
+    Queries may use AND, OR, NOT, parentheses and "quoted phrases" (see boolean_query.py). Matching
+    documents are found first, intersecting the rarest term's postings first, and only they are scored.
+    With a Vocabulary (see vocabulary.py), query words missing from the index are expanded to their
+    closest spelling corrections before the postings lookup.
     """
 
-    def __init__(self, publications, inverted_index):
+    RANKINGS = ("tfidf", "bm25")  # Supported ranking methods
+
+    def __init__(self, publications, inverted_index, tfidf_vectorizer=None, tfidf_matrix=None,
+                 bm25_ranker=None, ranking="tfidf", cache_size=1024, cache_ttl=None, positions=None,
+                 default_operator="and", facets=None, vocabulary=None, max_expansions=3):
         """
         Initialize the QueryProcessor.
 
         :param publications: Dictionary containing document metadata
         :param inverted_index: Dictionary mapping tokens to sets of document IDs.
+        :param tfidf_vectorizer: Optional TF-IDF vectorizer fitted on the whole corpus (see Indexer.build_tfidf).
+        :param tfidf_matrix: Optional precomputed document-term matrix matching tfidf_vectorizer.
+                             When both are given, only the query is vectorized at search time.
+        :param bm25_ranker: Optional BM25Ranker built from the indexer's term-frequency postings.
+        :param ranking: Default ranking method, either "tfidf" or "bm25".
+        :param cache_size: Maximum number of cached result lists and query vectors. 0 disables caching.
+        :param cache_ttl: Optional lifetime of cached entries in seconds.
+        :param positions: Optional mapping of token -> (document_id, positions) pairs for phrase queries.
+                          Without it, phrase candidates are re-tokenized to check the word order.
+        :param default_operator: Operator between words without an explicit AND/OR: "and" or "or".
+        :param facets: Optional FacetIndex over the publications, needed for filtered searches.
+        :param vocabulary: Optional Vocabulary of the index for autocompletion and spelling correction.
+        :param max_expansions: Maximum number of corrections ORed in for a word missing from the index.
+                               0 disables spelling correction.
         """
+        if ranking not in self.RANKINGS:
+            raise ValueError(f"Unknown ranking method: {ranking}")
         self.publications = publications
         self.inverted_index = inverted_index
+        self.tfidf_vectorizer = tfidf_vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.bm25_ranker = bm25_ranker
+        self.positions = positions
+        self.facets = facets
+        self.vocabulary = vocabulary
+        self.max_expansions = max_expansions
+        self.ranking = ranking
+        self.parser = QueryParser(default_operator)
+        self.indexer = None  # Set by from_indexer to follow incremental index updates
+        self.index_version = None
+        self.result_cache = QueryCache(cache_size, cache_ttl)  # Ranked results per normalized query
+        self.vector_cache = QueryCache(cache_size, cache_ttl)  # TF-IDF query vectors per analyzed query
+        self._analyzer = None  # Tokenizer of the TF-IDF vectorizer, used for cache keys
+
+    @classmethod
+    def from_indexer(cls, indexer, ranking="tfidf", k1=1.5, b=0.75, cache_size=1024, cache_ttl=None,
+                     default_operator="and", max_expansions=3):
+        """
+        Create a QueryProcessor that reads the index structures of an Indexer and picks up
+        its incremental updates (add/update/delete, merges) automatically.
+
+        :param indexer: A built or loaded Indexer.
+        :param ranking: Default ranking method, either "tfidf" or "bm25".
+        :param k1: BM25 term frequency saturation parameter.
+        :param b: BM25 document length normalization parameter.
+        :param cache_size: Maximum number of cached result lists and query vectors. 0 disables caching.
+        :param cache_ttl: Optional lifetime of cached entries in seconds.
+        :param default_operator: Operator between words without an explicit AND/OR: "and" or "or".
+        :param max_expansions: Maximum number of spelling corrections per unknown word. 0 disables them.
+        """
+        processor = cls(indexer.publications, indexer.inverted_index, indexer.tfidf_vectorizer,
+                        indexer.tfidf_matrix, BM25Ranker(indexer.postings, indexer.doc_lengths, k1, b), ranking,
+                        cache_size, cache_ttl, indexer.positions, default_operator, indexer.facet_index(),
+                        indexer.vocabulary, max_expansions)
+        processor.indexer = indexer
+        processor.index_version = indexer.version
+        return processor
 
-    def search(self, query):
+    def _sync_with_indexer(self):
+        """
+        Re-read the index structures if the indexer changed since the last search.
+        """
+        if self.indexer is None or self.indexer.version == self.index_version:
+            return
+        self.index_version = self.indexer.version
+        self.publications = self.indexer.publications
+        self.inverted_index = self.indexer.inverted_index
+        self.tfidf_vectorizer = self.indexer.tfidf_vectorizer
+        self.tfidf_matrix = self.indexer.tfidf_matrix
+        self.positions = self.indexer.positions
+        self.facets = self.indexer.facet_index()
+        self.vocabulary = self.indexer.vocabulary
+        self._analyzer = None
+        self.bm25_ranker.postings = self.indexer.postings
+        self.bm25_ranker.doc_lengths = self.indexer.doc_lengths
+        self.bm25_ranker.update_statistics()
+
+    def cache_stats(self):
+        """
+        Return hit/miss/eviction counters of the result and query-vector caches.
+        """
+        return {"results": self.result_cache.stats(), "query_vectors": self.vector_cache.stats()}
+
+    def _query_terms(self, query):
+        """
+        Return the query as tokens of the TF-IDF vectorizer, which is what its query vector depends on.
+        """
+        if self._analyzer is None:
+            if self.tfidf_vectorizer is None:
+                from sklearn.feature_extraction.text import TfidfVectorizer  # Imported on first use
+                self._analyzer = TfidfVectorizer().build_analyzer()
+            else:
+                self._analyzer = self.tfidf_vectorizer.build_analyzer()
+        return tuple(self._analyzer(query))
+
+    def search(self, query, top_k=None, ranking=None, operator=None, filters=None):
         """
         Search for documents relevant to the given query.
 
-        :param query: User input query string.
+        :param query: User input query string, optionally with AND, OR, NOT, parentheses and "quoted phrases".
+        :param top_k: Optional maximum number of results to return (at least 1). All matches are returned when None.
+        :param ranking: Ranking method for this query ("tfidf" or "bm25"). Defaults to the processor's ranking.
+        :param operator: Default operator for this query ("and" or "or"). Defaults to the processor's operator.
+        :param filters: Optional dictionary with "authors" (names), "years" (inclusive range) and/or
+                        "journals" (names), see FacetIndex.filter_mask. Applied before scoring.
         :return: List of tuples (document_id, similarity_score), sorted in descending order of relevance.
         """
-        # Preprocess the query (e.g., tokenization, stopword removal, stemming)
-        query_tokens = preprocess_text(query)
-        relevant_docs = set()  # Set to store document IDs containing query tokens
+        with instrumentation.span("search"):
+            return self._search(query, top_k, ranking, operator, filters)
 
-        # Identify documents containing query tokens using the inverted index
-        for token in query_tokens:
-            if token in self.inverted_index:
-                relevant_docs.update(self.inverted_index[token])
+    def _search(self, query, top_k, ranking, operator, filters):
+        """Run a search; see search for the parameters."""
+        ranking = ranking or self.ranking
+        if ranking not in self.RANKINGS:
+            raise ValueError(f"Unknown ranking method: {ranking}")
+        if top_k is not None and top_k < 1:
+            raise ValueError(f"top_k must be at least 1 or None, got {top_k}")
+        self._sync_with_indexer()
+
+        # Parse the query; words and phrases are preprocessed (tokenization, stopword removal, lemmatization)
+        parser = self.parser if operator is None else QueryParser(operator)
+        with instrumentation.span("search.preprocess"):
+            parsed = parser.parse(query)
+        if parsed is None:
+            return []
+
+        filters = {name: values for name, values in (filters or {}).items() if values}
+        if filters and self.facets is None:
+            raise ValueError("Filtered searches require a facet index.")
+
+        # Serve repeated queries from the cache; TF-IDF scores also depend on the vectorizer's tokens.
+        # The key is taken before spelling correction, whose result only changes with the index version.
+        cache_key = (ranking, top_k, query_key(parsed),
+                     tuple(sorted((name, tuple(values)) for name, values in filters.items())))
+        if ranking == "tfidf":
+            cache_key += (self._query_terms(" ".join(term.text for term in scoring_terms(parsed))),)
+        ranked_docs = self.result_cache.get(cache_key, self.index_version)
+        instrumentation.count("search.cache_hits" if ranked_docs is not None else "search.cache_misses")
+        if ranked_docs is None:
+            if self.vocabulary is not None and self.max_expansions:
+                with instrumentation.span("search.spelling"):
+                    parsed = self._expand(parsed)
+            terms = scoring_terms(parsed)  # Negated words do not contribute to the score
+            scoring_query = " ".join(term.text for term in terms)
+            query_tokens = [token for term in terms for token in term.tokens]
+            allowed = self.facets.filter_mask(**filters) if filters else None
+            ranked_docs = self._rank(scoring_query, parsed, query_tokens, top_k, ranking, allowed)
+            self.result_cache.put(cache_key, ranked_docs, self.index_version)
+        return list(ranked_docs)
+
+    def _rank(self, query, parsed, query_tokens, top_k, ranking, allowed=None):
+        """
+        Find and rank the documents for a parsed query.
+
+        :param query: Query text used for TF-IDF scoring (the words that are not negated).
+        :param parsed: Parsed query (see boolean_query.QueryParser).
+        :param query_tokens: Preprocessed tokens used for BM25 scoring.
+        :param top_k: Optional maximum number of results to return.
+        :param ranking: Ranking method, either "tfidf" or "bm25".
+        :param allowed: Optional boolean mask of the documents passing the search filters.
+        :return: List of tuples (document_id, similarity_score), sorted in descending order of relevance.
+        """
+        if ranking == "bm25":
+            if self.bm25_ranker is None:
+                raise ValueError("BM25 ranking requires a bm25_ranker.")
+            # Unfiltered any-word queries are scored straight from the postings, without building a candidate set first
+            if allowed is None and self._is_disjunction(parsed):
+                with instrumentation.span("search.bm25_score"):
+                    return self.bm25_ranker.score(query_tokens, top_k)
+            candidates = self._candidates(parsed, allowed)
+            with instrumentation.span("search.bm25_score"):
+                return self.bm25_ranker.score(query_tokens, top_k, candidates) if candidates else []
+
+        # Identify the matching documents using the inverted index, then apply the filters
+        relevant_docs = set(self._candidates(parsed, allowed))
 
         # If relevant documents are found, rank them using TF-IDF and cosine similarity
         if relevant_docs:
+            # Use the corpus-wide model when it is available
+            if self.tfidf_matrix is not None:
+                return self._rank_precomputed(query, relevant_docs, top_k)
+
+            from sklearn.feature_extraction.text import TfidfVectorizer  # Imported on first use
+            from sklearn.metrics.pairwise import cosine_similarity
+
             # Extract document titles for TF-IDF vectorization
             documents = [self.publications[doc_id]["title"] for doc_id in relevant_docs]
 
@@ -42,13 +221,15 @@ class QueryProcessor:
             vectorizer = TfidfVectorizer()
 
             # Convert documents into TF-IDF feature vectors
-            doc_vectors = vectorizer.fit_transform(documents)
+            with instrumentation.span("search.tfidf_fit"):
+                doc_vectors = vectorizer.fit_transform(documents)
 
-            # Transform the query into a TF-IDF vector
-            query_vector = vectorizer.transform([query])
+                # Transform the query into a TF-IDF vector
+                query_vector = vectorizer.transform([query])
 
             # Compute cosine similarity between the query and document vectors
-            similarities = cosine_similarity(query_vector, doc_vectors).flatten()
+            with instrumentation.span("search.cosine"):
+                similarities = cosine_similarity(query_vector, doc_vectors).flatten()
 
             # Pair document IDs with their similarity scores
             ranked_docs = [(doc_id, score) for doc_id, score in zip(relevant_docs, similarities)]
@@ -56,7 +237,223 @@ class QueryProcessor:
             # Sort documents by similarity score in descending order
             ranked_docs.sort(key=lambda x: x[1], reverse=True)
 
-            return ranked_docs  # Return ranked results
+            return ranked_docs[:top_k]  # Return ranked results
 
         else:
             return []  # Return an empty list if no relevant documents are found
+
+    def _corrections(self, token, limit):
+        """
+        Return up to limit corrections of a token missing from the index, all at the smallest edit
+        distance found, most frequent first; an empty list if the token is indexed or has none.
+        """
+        if isinstance(self.inverted_index, DocumentIdView):
+            if self.inverted_index.has_live_postings(token):  # Tokens whose postings were all deleted are missing
+                return []
+        elif token in self.inverted_index:  # Membership only; getting the postings would decode them
+            return []
+        # A deleted token can still be in the vocabulary of the base index, as its own correction
+        corrections = [correction for correction in self.vocabulary.corrections(token, limit=limit + 1)
+                       if correction[0] != token][:limit]
+        return [term for term, distance, _ in corrections if distance == corrections[0][1]]
+
+    def _expand(self, node):
+        """
+        Replace the words of a parsed query that are missing from the index by their spelling corrections.
+
+        A single-token word becomes an OR of up to max_expansions corrections; in phrases and
+        multi-token words each missing token is replaced by its best correction.
+        """
+        if isinstance(node, (And, Or)):
+            children = []
+            for child in node.children:
+                child = self._expand(child)
+                if isinstance(node, Or) and isinstance(child, Or):
+                    children.extend(child.children)  # Keep ORs flat
+                else:
+                    children.append(child)
+            return type(node)(tuple(children))
+        if isinstance(node, Not):
+            return Not(self._expand(node.child))
+
+        if isinstance(node, Term) and len(node.tokens) == 1:
+            corrections = self._corrections(node.tokens[0], self.max_expansions)
+            if len(corrections) > 1:
+                return Or(tuple(Term(term, (term,)) for term in corrections))
+        tokens = tuple((self._corrections(token, 1) or [token])[0] for token in node.tokens)
+        if tokens == node.tokens:
+            return node
+        return type(node)(" ".join(tokens), tokens)
+
+    def suggest(self, query):
+        """
+        Return the query with misspelled words replaced by their best correction ("Did you mean"),
+        or None if every word is in the index or has no correction.
+
+        Corrected words are given in their preprocessed (lemmatized) form; operators, quotes and
+        parentheses are kept.
+        """
+        self._sync_with_indexer()
+        if self.vocabulary is None:
+            return None
+        corrected = False
+
+        def correct(match):
+            nonlocal corrected
+            word = match.group()
+            if word in ("AND", "OR", "NOT"):
+                return word
+            prefix = "-" if word.startswith("-") and len(word) > 1 else ""
+            tokens = preprocess_text(word[len(prefix):])
+            corrections = [(self._corrections(token, 1) or [token])[0] for token in tokens]
+            if corrections == tokens:
+                return word
+            corrected = True
+            return prefix + " ".join(corrections)
+
+        suggestion = re.sub(r'[^\s()"]+', correct, query)
+        return suggestion if corrected else None
+
+    def autocomplete(self, query, limit=5):
+        """
+        Complete the last word of a query being typed with the most frequent indexed terms starting with it.
+
+        :param query: Partial user input.
+        :param limit: Maximum number of completions.
+        :return: List of completed query strings, most frequent completion first.
+        """
+        self._sync_with_indexer()
+        match = re.search(r'([^\s()"-]+)$', query)
+        if self.vocabulary is None or match is None:
+            return []
+        head, prefix = query[:match.start()], match.group().lower()
+        return [head + term for term, _ in self.vocabulary.complete(prefix, limit)]
+
+    @staticmethod
+    def _is_disjunction(parsed):
+        """Whether a parsed query matches any document containing one of its tokens."""
+        words = parsed.children if isinstance(parsed, Or) else (parsed,)
+        return all(isinstance(word, Term) and len(word.tokens) == 1 for word in words)
+
+    def _candidates(self, parsed, allowed):
+        """Return the sorted IDs of the documents matching a parsed query and the filters."""
+        with instrumentation.span("search.candidates"):
+            doc_ids = self._filter(self._evaluate(parsed), allowed)
+        instrumentation.count("search.candidates", len(doc_ids))
+        return doc_ids
+
+    @staticmethod
+    def _filter(doc_ids, allowed):
+        """Keep the candidate documents whose bit is set in the filter mask."""
+        if allowed is None or not doc_ids:
+            return doc_ids
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        doc_ids = doc_ids[doc_ids < len(allowed)]
+        return doc_ids[allowed[doc_ids]].tolist()
+
+    def facet_counts(self, doc_ids, top=10):
+        """
+        Count authors, years and journals among documents, e.g. the results of a search.
+
+        :param doc_ids: Iterable of document IDs.
+        :param top: Maximum number of values returned per field.
+        :return: Dictionary of field -> list of (value, count) pairs, most frequent first.
+        """
+        self._sync_with_indexer()
+        if self.facets is None:
+            raise ValueError("Facet counts require a facet index.")
+        return self.facets.facet_counts(doc_ids, top)
+
+    def _doc_ids(self, token):
+        """Return the sorted, unique IDs of the documents containing a token."""
+        doc_ids = self.inverted_index.get(token)
+        if not doc_ids:
+            return []
+        instrumentation.count("search.postings_scanned", len(doc_ids))
+        return sorted(set(doc_ids))  # The JSON index repeats an ID once per occurrence
+
+    def _all_doc_ids(self):
+        """Return the IDs of all documents that were not deleted (the universe of a negation)."""
+        return [doc_id for doc_id, pub in enumerate(self.publications) if pub]
+
+    def _evaluate(self, node):
+        """
+        Return the sorted IDs of the documents matching a parsed query.
+
+        The postings of all words and phrase words of a conjunction are intersected together,
+        shortest first, before phrases are checked and negated parts are removed.
+        """
+        if isinstance(node, Or):
+            return union_all([self._evaluate(child) for child in node.children])
+        if isinstance(node, Not):
+            return difference(self._all_doc_ids(), self._evaluate(node.child))
+
+        children = node.children if isinstance(node, And) else (node,)
+        included = [child for child in children if not isinstance(child, Not)]
+        lists = [self._doc_ids(token) for child in included if isinstance(child, (Term, Phrase))
+                 for token in child.tokens]
+        lists += [self._evaluate(child) for child in included if isinstance(child, Or)]
+        doc_ids = intersect_all(lists) if included else self._all_doc_ids()
+
+        for child in included:
+            if isinstance(child, Phrase) and doc_ids:
+                doc_ids = self._match_phrase(child.tokens, doc_ids)
+        for child in children:
+            if isinstance(child, Not) and doc_ids:
+                doc_ids = difference(doc_ids, self._evaluate(child.child))
+        return doc_ids
+
+    def _match_phrase(self, tokens, doc_ids):
+        """
+        Keep the documents in which the phrase tokens appear consecutively.
+
+        :param tokens: Preprocessed phrase tokens.
+        :param doc_ids: Sorted IDs of documents containing every phrase token.
+        """
+        if self.positions is not None:
+            token_positions = [dict(self.positions.get(token, ())) for token in tokens]
+            return [doc_id for doc_id in doc_ids
+                    if contains_phrase([positions.get(doc_id, ()) for positions in token_positions])]
+
+        # Without stored positions, re-tokenize the candidate titles
+        matches = []
+        for doc_id in doc_ids:
+            title_tokens = preprocess_text(self.publications[doc_id]["title"])
+            if contains_phrase([[i for i, title_token in enumerate(title_tokens) if title_token == token]
+                                for token in tokens]):
+                matches.append(doc_id)
+        return matches
+
+    def _rank_precomputed(self, query, relevant_docs, top_k):
+        """
+        Rank candidate documents against the precomputed TF-IDF matrix.
+
+        Rows of the matrix are L2-normalized, so a single sparse product gives the cosine similarity.
+
+        :param query: Query text to vectorize.
+        :param relevant_docs: Set of candidate document IDs from the inverted index.
+        :param top_k: Optional maximum number of results to return.
+        :return: List of tuples (document_id, similarity_score), sorted in descending order of relevance.
+        """
+        candidates = np.fromiter(sorted(relevant_docs), dtype=np.int64, count=len(relevant_docs))
+
+        # Only the query is vectorized; IDF weights come from the whole corpus
+        query_terms = self._query_terms(query)
+        query_vector = self.vector_cache.get(query_terms, self.index_version)
+        if query_vector is None:
+            with instrumentation.span("search.query_vector"):
+                query_vector = self.tfidf_vectorizer.transform([query])
+            self.vector_cache.put(query_terms, query_vector, self.index_version)
+        with instrumentation.span("search.cosine"):
+            scores = (self.tfidf_matrix[candidates] @ query_vector.T).toarray().ravel()
+
+        # Partial selection of the top-k before sorting only those; ties at the cut keep the lowest IDs
+        if top_k is not None and top_k < len(scores):
+            kth = np.partition(-scores, top_k - 1)[top_k - 1]
+            top = np.flatnonzero(-scores < kth)
+            top = np.concatenate([top, np.flatnonzero(-scores == kth)[:top_k - len(top)]])
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [(int(candidates[i]), float(scores[i])) for i in top]
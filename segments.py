@@ -0,0 +1,177 @@
+import json
+import os
+from collections.abc import Mapping
+
+
+class SegmentedPostings(Mapping):
+    """
+    A live view of token -> (document_id, term_frequency) postings over a base index and
+    a stack of small immutable segments. Token positions, as (document_id, positions) pairs,
+    are stacked the same way.
+
+    Each source has a generation: the base index has the generation it was merged at and every
+    segment has a higher one. A tombstone records the generation at which a document was deleted
+    or re-indexed, and hides that document's postings in every older source.
+    """
+
+    def __init__(self, base, base_generation=0):
+        """
+        Initialize the view.
+
+        :param base: Mapping of token -> (document_id, term_frequency) pairs from the base index.
+        :param base_generation: Generation of the base index.
+        """
+        self.base = base
+        self.base_generation = base_generation
+        self.segments = []  # Segment dictionaries in generation order
+        self.tombstones = {}  # Document ID -> generation at which its older postings became invalid
+
+    def add_segment(self, segment):
+        """
+        Stack a segment on top of the view.
+
+        :param segment: Dictionary with "generation", "postings" (token -> pairs) and "tombstones" (document IDs).
+        """
+        for doc_id in segment["tombstones"]:
+            self.tombstones[doc_id] = segment["generation"]
+        self.segments.append(segment)
+
+    def _sources(self):
+        yield self.base_generation, self.base
+        for segment in self.segments:
+            yield segment["generation"], segment["postings"]
+
+    def __getitem__(self, token):
+        pairs = []
+        found = False
+        for generation, postings in self._sources():
+            source_pairs = postings.get(token)
+            if source_pairs is None:
+                continue
+            found = True
+            pairs.extend(pair for pair in source_pairs if self.tombstones.get(pair[0], -1) <= generation)
+        if not found:
+            raise KeyError(token)
+        return sorted(pairs) if self.segments else pairs
+
+    def __contains__(self, token):
+        return any(token in postings for _, postings in self._sources())
+
+    def has_live_postings(self, token):
+        """
+        Whether a token has postings that no tombstone hides (unlike `in`, which also counts hidden ones).
+
+        The segments are small and checked first, newest first; the base postings are only looked
+        at when no segment has a live posting, and not at all when nothing was deleted or re-indexed.
+        """
+        if not self.tombstones:
+            return token in self
+        for generation, postings in reversed(list(self._sources())):
+            pairs = postings.get(token)
+            if pairs and any(self.tombstones.get(doc_id, -1) <= generation for doc_id, _ in pairs):
+                return True
+        return False
+
+    def __iter__(self):
+        seen = set()
+        for _, postings in self._sources():
+            for token in postings:
+                if token not in seen:
+                    seen.add(token)
+                    yield token
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class DocumentIdView(Mapping):
+    """Mapping of token -> sorted document IDs over a SegmentedPostings view."""
+
+    def __init__(self, postings):
+        self.postings = postings
+
+    def __getitem__(self, token):
+        return [doc_id for doc_id, _ in self.postings[token]]
+
+    def __contains__(self, token):
+        return token in self.postings
+
+    def has_live_postings(self, token):
+        """Whether a token has postings that no tombstone hides (see SegmentedPostings.has_live_postings)."""
+        if isinstance(self.postings, SegmentedPostings):
+            return self.postings.has_live_postings(token)
+        return bool(self.postings.get(token))
+
+    def __iter__(self):
+        return iter(self.postings)
+
+    def __len__(self):
+        return len(self.postings)
+
+
+class SegmentStore:
+    """
+    Stores index segments as small JSON files in a directory, listed by a manifest.
+
+    The manifest is replaced atomically, so a segment becomes visible only once it is fully written.
+    """
+
+    def __init__(self, directory):
+        """
+        Initialize the SegmentStore.
+
+        :param directory: Directory holding the manifest and segment files.
+        """
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "manifest.json")
+
+    def read_manifest(self):
+        """
+        Read the manifest, or return an empty one if no segments were ever written.
+        """
+        try:
+            with open(self.manifest_file, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"base_generation": 0, "next_generation": 1, "segments": []}
+
+    def write_manifest(self, manifest):
+        """Atomically replace the manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_file = self.manifest_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temp_file, self.manifest_file)
+
+    def write_segment(self, segment):
+        """
+        Write a segment file and return its file name (relative to the directory).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"segment-{segment['generation']:08d}.json"
+        temp_file = os.path.join(self.directory, name + ".tmp")
+        with open(temp_file, "w") as f:
+            json.dump(segment, f)  # Compact JSON; segments are small
+        os.replace(temp_file, os.path.join(self.directory, name))
+        return name
+
+    def read_segment(self, name):
+        """
+        Read a segment file, converting JSON keys and lists back to document IDs and pairs.
+        """
+        with open(os.path.join(self.directory, name), "r") as f:
+            segment = json.load(f)
+        segment["postings"] = {token: [tuple(pair) for pair in pairs] for token, pairs in segment["postings"].items()}
+        if "positions" in segment:
+            segment["positions"] = {token: [(doc_id, tuple(positions)) for doc_id, positions in pairs]
+                                    for token, pairs in segment["positions"].items()}
+        segment["doc_lengths"] = {int(doc_id): length for doc_id, length in segment["doc_lengths"].items()}
+        segment["documents"] = {int(doc_id): pub for doc_id, pub in segment["documents"].items()}
+        return segment
+
+    def remove_segment(self, name):
+        """Delete a segment file that is no longer listed in the manifest."""
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
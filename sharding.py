@@ -0,0 +1,288 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from boolean_query import OPERATORS
+from indexer import Indexer
+from query_processor import QueryProcessor
+
+SHARD_DIR = "index_shards"
+MANIFEST_FILE = "shards.json"
+STATISTICS_FILE = "global_stats.json"
+
+
+class _ShardIndexer(Indexer):
+    """
+    Indexer for one shard: the TF-IDF model is the collection-wide vectorizer, applied to the
+    shard's titles instead of a vectorizer fitted on the shard alone.
+    """
+
+    PARALLEL_THRESHOLD = float("inf")  # Shards are already built in parallel processes
+
+    def __init__(self, publications, index_file, tfidf_vectorizer):
+        super().__init__(publications, index_file=index_file)
+        self.global_vectorizer = tfidf_vectorizer
+
+    def build_tfidf(self):
+        self.tfidf_vectorizer = self.global_vectorizer
+        self.tfidf_matrix = self.tfidf_vectorizer.transform(self._titles(self.publications)).tocsr()
+
+
+def _tfidf_doc_freqs(titles):
+    """Count the documents containing each token of the default TF-IDF analyzer (build phase 1)."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    analyzer = TfidfVectorizer().build_analyzer()
+    doc_freqs = Counter()
+    for title in titles:
+        doc_freqs.update(set(analyzer(title)))
+    return doc_freqs
+
+
+def _build_shard(shard, publications, tfidf_vectorizer):
+    """
+    Build and save one shard (build phase 2).
+
+    :return: Token -> document frequency, number of non-empty documents and total length of the shard.
+    """
+    with open(shard["publications_file"], "w") as f:
+        json.dump(publications, f)
+    indexer = _ShardIndexer(publications, shard["index_file"], tfidf_vectorizer)
+    indexer.build_index()
+    doc_freqs = {token: len(pairs) for token, pairs in indexer.postings.items()}
+    return doc_freqs, sum(1 for length in indexer.doc_lengths if length), sum(indexer.doc_lengths)
+
+
+def build_shards(publications, directory=SHARD_DIR, num_shards=4, workers=None):
+    """
+    Partition the publications by document ID range and build every shard's index in parallel.
+
+    TF-IDF IDF weights and BM25 statistics are computed over the whole collection, so that sharded
+    search returns the same scores as a single index.
+
+    :param publications: List of publication dictionaries (None for deleted publications).
+    :param directory: Directory receiving the shard files and the manifest.
+    :param num_shards: Number of shards.
+    :param workers: Number of build processes. Defaults to the number of shards.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    os.makedirs(directory, exist_ok=True)
+    bounds = np.linspace(0, len(publications), num_shards + 1).astype(int)
+    shards = [{"start": int(start), "end": int(end),
+               "index_file": os.path.join(directory, f"shard-{i:03d}.bin"),
+               "publications_file": os.path.join(directory, f"shard-{i:03d}.json")}
+              for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))]
+    slices = [publications[shard["start"]:shard["end"]] for shard in shards]
+
+    with ProcessPoolExecutor(workers or num_shards) as executor:
+        # Phase 1: collection-wide TF-IDF vocabulary and IDF (smoothed, as TfidfVectorizer computes it)
+        doc_freqs = Counter()
+        for shard_doc_freqs in executor.map(_tfidf_doc_freqs, [Indexer._titles(pubs) for pubs in slices]):
+            doc_freqs.update(shard_doc_freqs)
+        vocabulary = sorted(doc_freqs)
+        tfidf_vectorizer = TfidfVectorizer(vocabulary=vocabulary)
+        tfidf_vectorizer.idf_ = np.log((1 + len(publications)) /
+                                       (1 + np.array([doc_freqs[token] for token in vocabulary], dtype=float))) + 1
+
+        # Phase 2: postings, positions and TF-IDF rows of every shard
+        token_doc_freqs = Counter()
+        num_docs = total_length = 0
+        for shard_doc_freqs, shard_docs, shard_length in executor.map(
+                _build_shard, shards, slices, [tfidf_vectorizer] * len(shards)):
+            token_doc_freqs.update(shard_doc_freqs)
+            num_docs += shard_docs
+            total_length += shard_length
+
+    # BM25 statistics of the whole collection
+    with open(os.path.join(directory, STATISTICS_FILE), "w") as f:
+        json.dump({"num_docs": num_docs, "total_length": total_length, "doc_freqs": token_doc_freqs}, f)
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump({"num_docs": len(publications), "shards": shards}, f, indent=4)
+    print(f"Built {num_shards} shards of {len(publications)} publications in {directory}.")
+
+
+def _shard_worker(connection, shard, statistics_file, ranking, k1, b):
+    """
+    Serve searches on one shard: receive (query, top_k, ranking, operator, filters) tuples,
+    reply with the shard's top-k results using local document IDs. None stops the worker.
+    """
+    with open(shard["publications_file"], "r") as f:
+        publications = json.load(f)
+    indexer = Indexer(publications, index_file=shard["index_file"])
+    indexer.load_index()
+    # Shards only know their own vocabulary, so a word indexed elsewhere would be "corrected" here
+    query_processor = QueryProcessor.from_indexer(indexer, ranking, k1, b, max_expansions=0)
+
+    with open(statistics_file, "r") as f:
+        statistics = json.load(f)
+    num_docs = statistics["num_docs"]
+    query_processor.bm25_ranker.use_global_statistics(
+        num_docs, statistics["total_length"] / num_docs if num_docs else 0.0, statistics["doc_freqs"])
+    del statistics
+
+    connection.send(len(publications))  # Ready
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        try:
+            connection.send(query_processor.search(*request))
+        except Exception as e:  # Reported to the coordinator instead of killing the worker
+            connection.send(e)
+    connection.close()
+
+
+class ShardedSearcher:
+    """
+    A query coordinator over a sharded index.
+
+    Each shard is served by its own worker process; a query is sent to all of them at once, and their
+    top-k lists are merged. Scores equal those of a single index over the whole collection.
+    """
+
+    def __init__(self, directory=SHARD_DIR, ranking="tfidf", k1=1.5, b=0.75, max_pending=64):
+        """
+        Start one worker process per shard.
+
+        :param directory: Directory written by build_shards.
+        :param ranking: Default ranking method, either "tfidf" or "bm25".
+        :param k1: BM25 term frequency saturation parameter.
+        :param b: BM25 document length normalization parameter.
+        :param max_pending: Maximum number of queries in flight per shard in search_batch.
+        """
+        with open(os.path.join(directory, MANIFEST_FILE), "r") as f:
+            self.manifest = json.load(f)
+        self.max_pending = max_pending
+        self.offsets = [shard["start"] for shard in self.manifest["shards"]]
+        self._connections = []
+        self._processes = []
+        for shard in self.manifest["shards"]:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_shard_worker, args=(child, shard, os.path.join(directory, STATISTICS_FILE), ranking, k1, b),
+                daemon=True)
+            process.start()
+            self._connections.append(parent)
+            self._processes.append(process)
+        for connection in self._connections:
+            connection.recv()  # Wait until every shard is loaded
+
+    @staticmethod
+    def _validate(query, top_k, ranking, operator):
+        """Reject invalid requests before they reach the workers (see QueryProcessor.search)."""
+        if not isinstance(query, str):
+            raise TypeError(f"query must be a string, got {type(query).__name__}")
+        if top_k is not None and top_k < 1:
+            raise ValueError(f"top_k must be at least 1 or None, got {top_k}")
+        if ranking is not None and ranking not in QueryProcessor.RANKINGS:
+            raise ValueError(f"Unknown ranking method: {ranking}")
+        if operator is not None and operator not in OPERATORS:
+            raise ValueError(f"Unknown default operator: {operator}")
+
+    def _send(self, request):
+        for connection in self._connections:
+            connection.send(request)
+
+    def _gather(self, top_k):
+        """
+        Receive one reply from every shard and merge them into global top-k results.
+
+        Every shard's reply is received before an error is raised, so no stale reply is left in a pipe.
+        """
+        results, error = [], None
+        for offset, connection in zip(self.offsets, self._connections):
+            reply = connection.recv()
+            if isinstance(reply, Exception):
+                error = error or reply
+            elif error is None:
+                results.extend((offset + doc_id, score) for doc_id, score in reply)
+        if error is not None:
+            raise error
+        if top_k is not None:
+            return heapq.nsmallest(top_k, results, key=lambda x: (-x[1], x[0]))
+        return sorted(results, key=lambda x: (-x[1], x[0]))
+
+    def search(self, query, top_k=10, ranking=None, operator=None, filters=None):
+        """
+        Search all shards in parallel.
+
+        :param query: User input query string (see QueryProcessor.search).
+        :param top_k: Maximum number of results; each shard returns at most this many. None returns all matches.
+        :return: List of tuples (document_id, score) with global document IDs, best first.
+        """
+        self._validate(query, top_k, ranking, operator)
+        self._send((query, top_k, ranking, operator, filters))
+        return self._gather(top_k)
+
+    def search_batch(self, queries, top_k=10, ranking=None, operator=None, filters=None):
+        """
+        Search many queries, keeping up to max_pending of them in flight on every shard.
+
+        :return: List of result lists, in query order.
+        """
+        queries = list(queries)
+        for query in queries:
+            self._validate(query, top_k, ranking, operator)
+        results = []
+        in_flight = 0
+        try:
+            for query in queries:
+                self._send((query, top_k, ranking, operator, filters))
+                in_flight += 1
+                if in_flight >= self.max_pending:  # Replies arrive in order, so the oldest query is gathered first
+                    in_flight -= 1
+                    results.append(self._gather(top_k))
+            while in_flight:
+                in_flight -= 1
+                results.append(self._gather(top_k))
+        except Exception:
+            for _ in range(in_flight):  # Drain the replies of the queries still in flight
+                try:
+                    self._gather(top_k)
+                except Exception:
+                    pass
+            raise
+        return results
+
+    def close(self):
+        """Stop the shard workers."""
+        for connection, process in zip(self._connections, self._processes):
+            connection.send(None)
+            process.join()
+            connection.close()
+        self._connections, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or search a sharded publication index.")
+    parser.add_argument("--directory", default=SHARD_DIR, help="Shard directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Partition publications.json into shards and index them")
+    build.add_argument("--data-file", default="publications.json", help="Publications to index")
+    build.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Number of shards")
+    search = commands.add_parser("search", help="Search the shards")
+    search.add_argument("query")
+    search.add_argument("--top-k", type=int, default=10)
+    search.add_argument("--ranking", choices=QueryProcessor.RANKINGS, default="tfidf")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.data_file, "r") as f:
+            build_shards(json.load(f), args.directory, args.shards)
+    else:
+        with ShardedSearcher(args.directory, args.ranking) as searcher:
+            for doc_id, score in searcher.search(args.query, args.top_k):
+                print(f"{score:8.4f}  {doc_id}")
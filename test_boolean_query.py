@@ -0,0 +1,92 @@
+import random
+from collections import Counter
+
+import pytest
+
+from bm25 import BM25Ranker
+from boolean_query import (And, Not, Or, Phrase, QueryParser, Term, contains_phrase, gallop_intersect,
+                           intersect_all)
+from query_processor import QueryProcessor
+from utils import preprocess_text
+
+TITLES = [
+    "Corporate finance and risk management",
+    "Risk of corporate default",
+    "Management of public finance",
+    "Health economic policy",
+]
+
+
+@pytest.fixture
+def processor():
+    """A QueryProcessor over the titles above, with positions for phrase queries and a BM25 ranker."""
+    publications = [{"title": title} for title in TITLES]
+    inverted_index, postings, positions, doc_lengths = {}, {}, {}, []
+    for doc_id, title in enumerate(TITLES):
+        tokens = preprocess_text(title)
+        doc_lengths.append(len(tokens))
+        for token, tf in Counter(tokens).items():
+            inverted_index.setdefault(token, []).append(doc_id)
+            postings.setdefault(token, []).append((doc_id, tf))
+            positions.setdefault(token, []).append((doc_id, [i for i, t in enumerate(tokens) if t == token]))
+    return QueryProcessor(publications, inverted_index, bm25_ranker=BM25Ranker(postings, doc_lengths),
+                          positions=positions, cache_size=0)
+
+
+def test_parse_operators_and_precedence():
+    node = QueryParser().parse("finance OR risk AND policy")
+    assert node == Or((Term("finance", ("finance",)), And((Term("risk", ("risk",)), Term("policy", ("policy",))))))
+    assert QueryParser().parse("finance and risk") == And((Term("finance", ("finance",)), Term("risk", ("risk",))))
+    assert QueryParser("or").parse("finance risk") == Or((Term("finance", ("finance",)), Term("risk", ("risk",))))
+    assert QueryParser().parse("the (of)") is None
+
+
+def test_parse_negation():
+    finance = Term("finance", ("finance",))
+    assert QueryParser().parse("NOT finance") == Not(finance)
+    assert QueryParser().parse("-finance") == Not(finance)
+    assert QueryParser().parse('risk -"corporate finance"') == And((
+        Term("risk", ("risk",)), Not(Phrase("corporate finance", ("corporate", "finance")))))
+    assert QueryParser().parse("risk -(finance OR policy)") == And((
+        Term("risk", ("risk",)), Not(Or((finance, Term("policy", ("policy",)))))))
+    any_word = Or((Term("risk", ("risk",)), Term("policy", ("policy",))))
+    assert QueryParser("or").parse("risk policy -finance") == And((any_word, Not(finance)))
+    assert QueryParser("or").parse("-finance risk policy") == And((any_word, Not(finance)))
+    assert QueryParser("or").parse("-finance") == Not(finance)
+    assert QueryParser("or").parse("risk AND -finance policy") == Or((
+        And((Term("risk", ("risk",)), Not(finance))), Term("policy", ("policy",))))
+
+
+def test_gallop_intersect():
+    rng = random.Random(0)
+    for _ in range(200):
+        small = sorted(rng.sample(range(1000), rng.randint(0, 20)))
+        large = sorted(rng.sample(range(1000), rng.randint(0, 500)))
+        assert gallop_intersect(small, large) == sorted(set(small) & set(large))
+    assert intersect_all([[1, 2, 3, 9], [2, 3, 5, 9], [3, 9]]) == [3, 9]
+    assert intersect_all([[1, 2], [], [2]]) == []
+    assert intersect_all([]) == []
+
+
+def test_contains_phrase():
+    assert contains_phrase([[0, 4], [5], [6]])
+    assert not contains_phrase([[0, 4], [1], [6]])
+    assert not contains_phrase([[0], []])
+
+
+@pytest.mark.parametrize("ranking", ["tfidf", "bm25"])
+def test_phrase_search(processor, ranking):
+    assert [doc_id for doc_id, _ in processor.search('"corporate finance"', ranking=ranking)] == [0]
+    assert [doc_id for doc_id, _ in processor.search('"risk corporate"', ranking=ranking)] == [1]
+    assert [doc_id for doc_id, _ in processor.search('finance -"corporate finance"', ranking=ranking)] == [2]
+
+
+@pytest.mark.parametrize("query", ["risk policy -finance", "-finance risk policy"])
+def test_any_word_negation(processor, query):
+    assert sorted(doc_id for doc_id, _ in processor.search(query, operator="or")) == [1, 3]
+
+
+@pytest.mark.parametrize("ranking", ["tfidf", "bm25"])
+def test_pure_negation(processor, ranking):
+    assert processor.search("NOT finance", ranking=ranking) == [(1, 0.0), (3, 0.0)]
+    assert processor.search('-"corporate finance"', ranking=ranking, top_k=2) == [(1, 0.0), (2, 0.0)]
@@ -0,0 +1,136 @@
+import functools
+import json
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from crawl_state import CrawlState
+from crawler import Crawler
+from fetcher import FetchResult, HttpFetcher
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_pages")  # Saved pureportal pages
+
+
+class _PortalHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the saved pages. Paths in the server's blocked set get a 403 challenge response, and
+    paths in its replaced dictionary get the given HTML instead of the saved page.
+    """
+
+    def do_GET(self):
+        if self.path in self.server.blocked:
+            self.send_error(403, "Just a moment...")
+            return
+        if self.path.rstrip("/") in self.server.replaced:
+            body = self.server.replaced[self.path.rstrip("/")].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass  # Keep test output quiet
+
+
+@pytest.fixture
+def portal():
+    """Serve the saved pureportal pages on a local HTTP server and yield its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_PortalHandler, directory=PAGES_DIR))
+    server.blocked = set()
+    server.replaced = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def _crawler(server, tmp_path, fetcher=None):
+    return Crawler(_base_url(server), crawl_delay=0.01, data_file=str(tmp_path / "publications.json"),
+                   fetcher=fetcher, state_file=str(tmp_path / "crawl_state.db"), parse_workers=0)
+
+
+class _BrowserStub:
+    """
+    Stands in for SeleniumFetcher past a bot challenge: returns the saved page wrapped in HTML,
+    as a browser's page_source wraps a plain text document.
+    """
+
+    def fetch(self, url, headers=None, ready_selector=None):
+        with open(os.path.join(PAGES_DIR, urlparse(url).path.lstrip("/"))) as f:
+            text = f.read()
+        return FetchResult(url, 200, f"<html><head></head><body><pre>{text}</pre></body></html>", {})
+
+    def close(self):
+        pass
+
+
+def test_crawl_saved_pages(portal, tmp_path):
+    crawler = _crawler(portal, tmp_path)
+    changes = crawler.crawl_publications()
+
+    assert crawler.crawl_delay == 1
+    assert len(changes["added"]) == len(crawler.publications) == 12
+    assert not changes["changed"] and not changes["removed"]
+    titles = {pub["title"] for pub in crawler.publications}
+    assert "Profiling European citizen scientist:  Evidence from Poland" in titles
+    pub = next(pub for pub in crawler.publications if pub["title"].startswith("Profiling European"))
+    assert pub["publication_year"] == "2023"
+    assert pub["journal"] == "In:Journal of International Studies."
+    assert pub["link"] == _base_url(portal) + "en/publications/profiling-european-citizen-scientist-evidence-from-poland"
+    with open(tmp_path / "publications.json") as f:
+        assert json.load(f) == crawler.publications
+
+
+def test_robots_txt_disallow(portal, tmp_path):
+    crawler = _crawler(portal, tmp_path)
+    crawler.crawl_publications()
+    assert not crawler._allowed(_base_url(portal) + "en/persons/blocked-author/publications")
+    assert all("blocked-author" not in author["link"] for pub in crawler.publications for author in pub["authors"])
+
+
+def test_recrawl_without_changes(portal, tmp_path):
+    _crawler(portal, tmp_path).crawl_publications()
+    crawler = _crawler(portal, tmp_path)
+    crawler.load_data()
+    changes = crawler.crawl_publications()
+    assert changes == {"added": [], "changed": [], "removed": []}
+    assert len(crawler.publications) == 12
+
+
+def test_blocked_robots_txt_from_browser(portal, tmp_path):
+    portal.blocked.add("/robots.txt")
+    fetcher = HttpFetcher(browser_fallback=_BrowserStub())
+    crawler = _crawler(portal, tmp_path, fetcher)
+    crawler._check_robots_txt()
+    assert crawler.crawl_delay == 1
+    assert not crawler._allowed(_base_url(portal) + "en/persons/blocked-author/publications")
+
+
+def test_challenge_page_keeps_publications(portal, tmp_path):
+    _crawler(portal, tmp_path).crawl_publications()
+    portal.replaced["/en/persons/piotr-lis/publications"] = "<html><body><h1>Checking your browser</h1></body></html>"
+    crawler = _crawler(portal, tmp_path)
+    crawler.load_data()
+    changes = crawler.crawl_publications()
+    assert changes == {"added": [], "changed": [], "removed": []}
+    assert sum(pub is not None for pub in crawler.publications) == 12
+
+
+def test_validators_with_lowercase_headers(tmp_path):
+    state = CrawlState(str(tmp_path / "crawl_state.db"))
+    state.add_urls(["http://example.org/a"], "author")
+    state.mark_done("http://example.org/a", [], {"etag": '"abc"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, "")
+    assert state.conditional_headers("http://example.org/a") == {
+        "If-None-Match": '"abc"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    state.close()
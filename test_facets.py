@@ -0,0 +1,73 @@
+import copy
+import random
+
+import numpy as np
+
+from benchmark import generate_publications
+from facets import FIELDS, FacetIndex
+from indexer import Indexer
+
+
+def _assert_same(index, expected, rng):
+    assert index.num_docs == expected.num_docs
+    for field in FIELDS:
+        assert index.values[field] == expected.values[field], field
+        assert index.bitmaps[field].keys() == expected.bitmaps[field].keys(), field
+        for value, bitmap in index.bitmaps[field].items():
+            doc_ids = expected.bitmaps[field][value].to_array().tolist()
+            assert bitmap.to_array().tolist() == doc_ids, (field, value)
+            mask = np.zeros(index.num_docs, dtype=bool)
+            bitmap.add_to(mask)
+            assert np.flatnonzero(mask).tolist() == doc_ids, (field, value)
+        for got, want in zip(index._forward[field], expected._forward[field]):
+            assert got.tolist() == want.tolist(), field
+    doc_ids = rng.sample(range(index.num_docs), min(50, index.num_docs))
+    assert index.facet_counts(doc_ids) == expected.facet_counts(doc_ids)
+    assert (index.filter_mask(years=(2005, 2015)) == expected.filter_mask(years=(2005, 2015))).all()
+    authors = [expected.values["author"][0], "Nobody, N."]
+    assert (index.filter_mask(authors=authors) == expected.filter_mask(authors=authors)).all()
+
+
+def test_updated_matches_rebuild():
+    """Random batches of added, changed and deleted documents give the index a rebuild would."""
+    rng = random.Random(1)
+    source = generate_publications(300, seed=4)
+    publications = copy.deepcopy(source[:200])
+    index = FacetIndex(publications)
+    for _ in range(100):
+        documents = {}
+        for _ in range(rng.randint(1, 6)):
+            kind = rng.random()
+            doc_id = len(publications) + rng.randint(0, 3) if kind < 0.3 else rng.randrange(len(publications))
+            publication = None
+            if kind <= 0.8:
+                publication = copy.deepcopy(rng.choice(source))
+                if rng.random() < 0.3:
+                    publication["authors"] = [{"name": f"New Author {rng.randint(0, 20)}"}]
+                if rng.random() < 0.2:
+                    publication["publication_year"] = str(rng.randint(1990, 2030))
+                if rng.random() < 0.2:
+                    publication["journal"] = f"In:Journal {rng.randint(0, 10)}."
+            documents[doc_id] = publication
+        previous, previous_publications = index, copy.deepcopy(publications)
+        for doc_id, publication in documents.items():
+            publications.extend([None] * (doc_id + 1 - len(publications)))
+            publications[doc_id] = publication
+
+        index = index.updated(documents)
+        _assert_same(index, FacetIndex(publications), rng)
+    _assert_same(previous, FacetIndex(previous_publications), rng)  # Left untouched by updated
+
+
+def test_indexer_facets_follow_segments(tmp_path):
+    publications = generate_publications(200, seed=6)
+    indexer = Indexer(copy.deepcopy(publications), index_file=str(tmp_path / "index.bin"))
+    indexer.build_index()
+    indexer.facet_index()  # Built now, so the changes below update it
+    indexer.add_documents(copy.deepcopy(publications[:10]))
+    changed = copy.deepcopy(publications[20])
+    changed["authors"] = [{"name": "Quagga, Q."}]
+    indexer.update_document(3, changed)
+    indexer.delete_document(4)
+    _assert_same(indexer.facet_index(), FacetIndex(indexer.publications), random.Random(0))
+    assert indexer.facet_index().facet_counts([3])["author"] == [("Quagga, Q.", 1)]
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from index_store import BinaryIndex, IndexFormatError, decode_varints, encode_varint, write_binary_index
+
+
+def _encode(values):
+    out = bytearray()
+    for value in values:
+        encode_varint(value, out)
+    return bytes(out)
+
+
+def test_varint_round_trip():
+    assert _encode([0, 1, 127]) == bytes([0, 1, 127])
+    assert _encode([128, 300]) == bytes([0x80, 0x01, 0xAC, 0x02])
+    rng = random.Random(0)
+    values = [rng.choice([0, 1, 127, 128, 16383, 16384, 2 ** 32, 2 ** 56, rng.randrange(10 ** 6)])
+              for _ in range(5000)]
+    assert decode_varints(_encode(values)).tolist() == values
+    assert decode_varints(b"").tolist() == []
+    assert decode_varints(bytes([1, 2, 3])).tolist() == [1, 2, 3]  # All single-byte values
+
+
+@pytest.fixture
+def index(tmp_path):
+    """A random binary index with positions, and the postings and positions it was written from."""
+    rng = random.Random(1)
+    postings, positions = {}, {}
+    for term in [f"t{i}" for i in range(200)] + ["économie", "ökonomie", "z"]:
+        doc_ids = sorted(rng.sample(range(50000), rng.randint(1, 300)))
+        postings[term] = [(doc_id, rng.randint(1, 4)) for doc_id in doc_ids]
+        positions[term] = [(doc_id, tuple(sorted(rng.sample(range(400), tf)))) for doc_id, tf in postings[term]]
+    postings["empty"] = []  # Tokens without postings are not written
+    doc_lengths = [rng.randint(0, 20) for _ in range(50000)]
+    path = str(tmp_path / "index.bin")
+    write_binary_index(path, postings, doc_lengths, positions)
+    index = BinaryIndex(path, verify=True)
+    yield index, postings, positions, doc_lengths
+    index.close()
+
+
+def test_binary_index_round_trip(index):
+    index, postings, positions, doc_lengths = index
+    assert list(index.doc_lengths) == doc_lengths
+    assert sorted(index) == sorted(term for term, pairs in postings.items() if pairs)
+    assert len(index) == len(postings) - 1 and "empty" not in index and "missing" not in index
+    positions_view = index.positions_view()
+    for term, pairs in postings.items():
+        if not pairs:
+            continue
+        assert index.postings(term) == pairs
+        assert index.postings_view()[term] == pairs
+        assert index[term] == [doc_id for doc_id, _ in pairs]
+        assert positions_view[term] == positions[term]
+    assert index.postings("missing") == []
+    with pytest.raises(KeyError):
+        index["missing"]
+
+
+def test_positions_not_matching_term_frequencies(tmp_path):
+    """Positions whose counts differ from the term frequencies are decoded record by record."""
+    path = str(tmp_path / "index.bin")
+    postings = {"a": [(1, 1), (5, 2)], "b": [(2, 3)]}
+    positions = {"a": [(1, (0, 4)), (5, (2,))], "b": [(2, (1, 2, 9))]}
+    write_binary_index(path, postings, [5] * 10, positions)
+    index = BinaryIndex(path, cache_pairs=0)
+    assert index.positions_view()["a"] == positions["a"]
+    assert index.positions_view()["b"] == positions["b"]
+    index.close()
+
+
+def test_invalid_files(tmp_path):
+    path = str(tmp_path / "index.bin")
+    with open(path, "wb") as f:
+        f.write(b"not an index" * 10)
+    with pytest.raises(IndexFormatError):
+        BinaryIndex(path)
+
+    write_binary_index(path, {"a": [(1, 1)]}, [1, 1])
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(IndexFormatError):
+        BinaryIndex(path, verify=True)
@@ -0,0 +1,111 @@
+import copy
+
+import pytest
+
+from benchmark import generate_publications, generate_queries
+from indexer import Indexer
+from query_processor import QueryProcessor
+
+
+@pytest.fixture(params=["bin", "json"])
+def index_file(request, tmp_path):
+    return str(tmp_path / f"index.{request.param}")
+
+
+def test_load_keeps_newer_publications(index_file):
+    """The refresh flow of crawler.py: crawl, load the index over the crawled list, apply the changes."""
+    publications = generate_publications(200, seed=5)
+    Indexer(copy.deepcopy(publications), index_file=index_file).build_index()
+
+    crawled = copy.deepcopy(publications)
+    crawled[0]["title"] = "Quagga zebra economics"
+    indexer = Indexer(crawled, index_file=index_file)
+    indexer.load_index()
+    assert indexer.publications[0]["title"] == "Quagga zebra economics"
+    indexer.apply_crawl_changes({"added": [], "changed": [0], "removed": []})
+
+    assert [doc_id for doc_id, _ in QueryProcessor.from_indexer(indexer, ranking="bm25").search("quagga")] == [0]
+    assert indexer.publications[0]["title"] == "Quagga zebra economics"
+
+
+def test_load_restores_added_publications(index_file):
+    """Documents added after the data file was written are restored from the index after a merge."""
+    publications = generate_publications(200, seed=5)
+    indexer = Indexer(copy.deepcopy(publications), index_file=index_file)
+    indexer.build_index()
+    doc_ids = indexer.add_documents([{"title": "Zyzzyva quantum accounting", "authors": [],
+                                      "publication_year": "2024", "journal": None, "link": ""}])
+    indexer.merge_segments()
+
+    reloaded = Indexer(copy.deepcopy(publications), index_file=index_file)  # The data file lacks the new document
+    reloaded.load_index()
+    assert reloaded.publications[doc_ids[0]]["title"] == "Zyzzyva quantum accounting"
+    assert [doc_id for doc_id, _ in QueryProcessor.from_indexer(reloaded).search("zyzzyva")] == doc_ids
+
+
+def test_new_words_trigger_merge(index_file):
+    """Words first seen in a segment get TF-IDF weight once the merge they trigger has finished."""
+    indexer = Indexer(generate_publications(200, seed=5), index_file=index_file)
+    indexer.build_index()
+    indexer.merge_threshold = 100
+    doc_ids = indexer.add_documents([{"title": "Zyzzyva quantum accounting", "authors": [],
+                                      "publication_year": "2024", "journal": None, "link": ""}])
+    indexer.wait_for_merge()
+
+    assert indexer.segment_store.read_manifest()["segments"] == []
+    results = QueryProcessor.from_indexer(indexer, ranking="tfidf").search("zyzzyva")
+    assert [doc_id for doc_id, _ in results] == doc_ids and results[0][1] > 0
+    assert "zyzzyva" in indexer.vocabulary
+
+
+def _live_postings(indexer):
+    return {token: list(indexer.postings[token]) for token in indexer.postings if indexer.postings[token]}
+
+
+def _results(indexer, queries, ranking):
+    query_processor = QueryProcessor.from_indexer(indexer, ranking=ranking, cache_size=0)
+    return [query_processor.search(query) for query in queries]
+
+
+def _assert_same_results(results, expected):
+    for got, want in zip(results, expected):
+        assert [doc_id for doc_id, _ in got] == [doc_id for doc_id, _ in want]
+        assert [score for _, score in got] == pytest.approx([score for _, score in want])
+
+
+def test_merge_matches_rebuild(index_file):
+    """Adding, updating and deleting documents, then merging, gives the index a rebuild would."""
+    publications = generate_publications(200, seed=7)
+    indexer = Indexer(copy.deepcopy(publications), index_file=index_file)
+    indexer.build_index()
+    indexer.merge_threshold = 100
+    # Only words the index already has, so that no merge starts before the one below
+    indexer.add_documents(copy.deepcopy(publications[100:140]))
+    indexer.update_document(3, copy.deepcopy(publications[150]))
+    indexer.delete_document(5)
+    indexer.update_document(210, copy.deepcopy(publications[50]))
+    indexer.delete_document(220)
+    assert len(indexer.segment_store.read_manifest()["segments"]) == 5
+
+    expected = publications + publications[100:140]
+    expected[3], expected[5], expected[210], expected[220] = publications[150], None, publications[50], None
+    rebuilt = Indexer(copy.deepcopy(expected), index_file=index_file.replace("index.", "rebuilt."))
+    rebuilt.build_index()
+    queries = generate_queries(expected, 40, seed=2) + ["NOT finance", '"corporate governance"']
+
+    # BM25 statistics follow the segments; TF-IDF weights are only refitted by the merge
+    _assert_same_results(_results(indexer, queries, "bm25"), _results(rebuilt, queries, "bm25"))
+
+    indexer.merge_segments()
+    assert indexer.segment_store.read_manifest()["segments"] == []
+    assert indexer.publications == expected
+    assert _live_postings(indexer) == _live_postings(rebuilt)
+    assert list(indexer.doc_lengths) == list(rebuilt.doc_lengths)
+    for ranking in ("tfidf", "bm25"):
+        _assert_same_results(_results(indexer, queries, ranking), _results(rebuilt, queries, ranking))
+
+    reloaded = Indexer(copy.deepcopy(expected), index_file=index_file)
+    reloaded.load_index()
+    assert _live_postings(reloaded) == _live_postings(rebuilt)
+    for ranking in ("tfidf", "bm25"):
+        _assert_same_results(_results(reloaded, queries, ranking), _results(rebuilt, queries, ranking))
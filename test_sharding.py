@@ -0,0 +1,56 @@
+import pytest
+
+from benchmark import generate_publications, generate_queries
+from indexer import Indexer
+from query_processor import QueryProcessor
+from sharding import ShardedSearcher, build_shards
+
+QUERIES = ['"corporate governance"', "market NOT risk", "NOT finance", "finance OR bank"]
+
+
+@pytest.fixture(scope="module")
+def collection(tmp_path_factory):
+    """A synthetic collection with one deleted publication, indexed whole and in three shards."""
+    directory = tmp_path_factory.mktemp("sharding")
+    publications = generate_publications(600, seed=3)
+    publications[5] = None
+    indexer = Indexer(list(publications), index_file=str(directory / "index.bin"))
+    indexer.build_index()
+    build_shards(publications, str(directory / "shards"), num_shards=3, workers=1)
+    with ShardedSearcher(str(directory / "shards")) as searcher:
+        yield publications, QueryProcessor.from_indexer(indexer, cache_size=0), searcher
+
+
+def _top(results, top_k):
+    return sorted(results, key=lambda x: (-x[1], x[0]))[:top_k]
+
+
+@pytest.mark.parametrize("ranking", ["tfidf", "bm25"])
+@pytest.mark.parametrize("filters", [None, {"years": (2000, 2015)}])
+def test_sharded_scores_match_single_index(collection, ranking, filters):
+    publications, query_processor, searcher = collection
+    queries = generate_queries(publications, 60, seed=1) + QUERIES
+    for query, results in zip(queries, searcher.search_batch(queries, top_k=10, ranking=ranking, filters=filters)):
+        expected = _top(query_processor.search(query, ranking=ranking, filters=filters), 10)
+        assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected], query
+        assert [score for _, score in results] == pytest.approx([score for _, score in expected]), query
+
+
+def test_invalid_request_rejected_by_coordinator(collection):
+    _, query_processor, searcher = collection
+    with pytest.raises(ValueError):
+        searcher.search("finance", top_k=0)
+    with pytest.raises(ValueError):
+        searcher.search_batch(["finance", "bank"], ranking="cosine")
+    assert searcher.search("finance", 3) == _top(query_processor.search("finance"), 3)
+
+
+def test_worker_error_leaves_no_stale_replies(collection):
+    _, query_processor, searcher = collection
+    with pytest.raises(TypeError):
+        searcher.search("finance", 3, filters={"publisher": ["Elsevier"]})  # Raised by every shard's worker
+    assert searcher.search("finance", 3) == _top(query_processor.search("finance"), 3)
+    with pytest.raises(TypeError):
+        searcher.search_batch(["finance", "bank", "market"], 3, filters={"publisher": ["Elsevier"]})
+    assert searcher.search_batch(["bank", "finance"], 3) == [_top(query_processor.search(query), 3)
+                                                             for query in ("bank", "finance")]
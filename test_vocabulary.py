@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from indexer import Indexer
+from query_processor import QueryProcessor
+from vocabulary import Vocabulary, _deletes, edit_distance
+
+DOC_FREQS = {"finance": 5, "financial": 3, "fiance": 1, "market": 4, "marker": 2, "markets": 0,
+             "bank": 7, "banker": 2, "band": 1, "bandwidth": 1}
+
+
+@pytest.fixture
+def vocabulary():
+    return Vocabulary.build(DOC_FREQS)
+
+
+def test_edit_distance():
+    assert edit_distance("finance", "finance", 2) == 0
+    assert edit_distance("finance", "fniance", 2) == 1  # Adjacent transposition
+    assert edit_distance("market", "marker", 2) == 1
+    assert edit_distance("bank", "bandwidth", 2) == 3  # Stops early past max_distance
+    assert edit_distance("bank", "", 2) == 3
+
+
+def test_deletes():
+    assert _deletes("abc", 1) == {"abc", "bc", "ac", "ab"}
+    assert _deletes("ab", 3) == {"ab", "a", "b", ""}
+    assert _deletes("hello", 1) == {"hello", "ello", "hllo", "helo", "hell"}
+
+
+def test_build(vocabulary, tmp_path):
+    assert len(vocabulary) == len(DOC_FREQS) - 1
+    assert "markets" not in vocabulary  # No documents left
+    assert "finance" in vocabulary and "financ" not in vocabulary
+    assert [vocabulary.term(i) for i in range(len(vocabulary))] == sorted(t for t, df in DOC_FREQS.items() if df)
+
+    path = str(tmp_path / "vocabulary.npz")
+    vocabulary.save(path)
+    loaded = Vocabulary.load(path)
+    assert [loaded.term(i) for i in range(len(loaded))] == [vocabulary.term(i) for i in range(len(vocabulary))]
+    assert loaded.corrections("finanse") == vocabulary.corrections("finanse")
+
+
+def test_corrections_ranking(vocabulary):
+    assert vocabulary.corrections("finance") == [("finance", 0, 5), ("fiance", 1, 1)]
+    assert vocabulary.corrections("finanse") == [("finance", 1, 5), ("fiance", 2, 1)]
+    # Same distance: the most frequent first, then alphabetical
+    assert vocabulary.corrections("markey") == [("market", 1, 4), ("marker", 1, 2)]
+    assert vocabulary.corrections("banc") == [("bank", 1, 7), ("band", 1, 1)]
+    assert vocabulary.corrections("bankr") == [("bank", 1, 7), ("banker", 1, 2), ("band", 2, 1)]
+    assert vocabulary.corrections("bankr", limit=1) == [("bank", 1, 7)]
+    assert vocabulary.corrections("bankr", max_distance=1) == [("bank", 1, 7), ("banker", 1, 2)]
+    assert vocabulary.corrections("zzzz") == []
+
+
+def test_corrections_match_brute_force():
+    rng = random.Random(0)
+    words = {"".join(rng.choice("abcde") for _ in range(rng.randint(1, 9))) for _ in range(300)}
+    vocabulary = Vocabulary.build({word: rng.randint(1, 50) for word in words}, prefix_length=4)
+    for _ in range(300):
+        word = "".join(rng.choice("abcdef") for _ in range(rng.randint(1, 10)))
+        expected = sorted((term, edit_distance(word, term, 2)) for term in words if edit_distance(word, term, 2) <= 2)
+        assert sorted((term, distance) for term, distance, _ in vocabulary.corrections(word, limit=len(words))) \
+            == expected, word
+
+
+def test_complete(vocabulary):
+    assert vocabulary.complete("ban") == [("bank", 7), ("banker", 2), ("band", 1), ("bandwidth", 1)]
+    assert vocabulary.complete("b", limit=2) == [("bank", 7), ("banker", 2)]  # Memoized short prefix
+    assert vocabulary.complete("ba", limit=3) == [("bank", 7), ("banker", 2), ("band", 1)]  # Tie: alphabetical
+    assert vocabulary.complete("fin") == [("finance", 5), ("financial", 3)]
+    assert vocabulary.complete("marketing") == []
+    assert vocabulary.complete("") == []
+
+
+def test_deleted_word_is_corrected(tmp_path):
+    """A word whose only document was deleted is corrected, although the base vocabulary still has it."""
+    publications = [{"title": title, "authors": [], "publication_year": "2020", "journal": None, "link": ""}
+                    for title in ["Banner advertising", "Banker pay", "Corporate governance"]]
+    indexer = Indexer(publications, index_file=str(tmp_path / "index.bin"))
+    indexer.build_index()
+    indexer.delete_document(0)
+
+    query_processor = QueryProcessor.from_indexer(indexer, cache_size=0)
+    assert "banner" in query_processor.vocabulary
+    assert query_processor.suggest("banner") == "banker"
+    assert [doc_id for doc_id, _ in query_processor.search("banner")] == [1]
+    assert query_processor.suggest("banker") is None
@@ -1,21 +1,156 @@
+import os
 import re
-import nltk
-from nltk.corpus import stopwords, wordnet
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from multiprocessing import Pool
 
-# Download necessary resources
-nltk.download("stopwords")
-nltk.download("punkt")
-nltk.download('punkt_tab')
-nltk.download("wordnet")
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
 
-STOP_WORDS = set(stopwords.words("english"))
-lemmatizer = WordNetLemmatizer()
+# NLTK, its corpora and scikit-learn are imported lazily on first use so that importing this
+# module is cheap and never touches the network. Required NLTK resources are looked up in the
+# project's nltk_data directory first, then in NLTK's default locations.
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+NLTK_OFFLINE = os.environ.get("NLTK_OFFLINE", "0") == "1"  # Never download missing resources when set
+LEMMA_CACHE_SIZE = 100_000  # Maximum number of distinct tokens whose lemma is kept in memory
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+STAGE_TIMINGS = {}  # Stage name -> seconds, filled by timed_stage
+
+@contextmanager
+def timed_stage(name):
+    """Record how long the wrapped block takes under the given stage name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_TIMINGS[name] = STAGE_TIMINGS.get(name, 0.0) + time.perf_counter() - start
+
+def startup_report():
+    """
+    Return the recorded stage timings, slowest first, as printable lines.
+    """
+    return [f"{name:<32} {seconds * 1000:9.1f} ms"
+            for name, seconds in sorted(STAGE_TIMINGS.items(), key=lambda x: x[1], reverse=True)]
+
+def peak_memory_mb():
+    """Return the peak resident memory of this process and its finished children in MB, if known."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB elsewhere
+
+@lru_cache(maxsize=None)
+def require_nltk_resource(path, package):
+    """
+    Make sure an NLTK resource is available, checking only once per process.
+
+    Missing resources are downloaded into the project's nltk_data directory unless NLTK_OFFLINE=1.
+
+    :param path: Resource path as used by nltk.data.find (e.g. "corpora/stopwords").
+    :param package: Name of the NLTK package providing it (e.g. "stopwords").
+    """
+    with timed_stage("import nltk"):
+        import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+    with timed_stage(f"check nltk {package}"):
+        try:
+            nltk.data.find(path)
+            return
+        except LookupError:
+            if NLTK_OFFLINE:
+                raise
+    with timed_stage(f"download nltk {package}"):
+        nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    """Load the English stopword set on first use."""
+    require_nltk_resource("corpora/stopwords", "stopwords")
+    with timed_stage("load stopwords"):
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words("english"))
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    """Load the WordNet lemmatizer on first use."""
+    require_nltk_resource("corpora/wordnet", "wordnet")
+    with timed_stage("load wordnet"):
+        from nltk.stem import WordNetLemmatizer
+        lemmatizer = WordNetLemmatizer()
+        lemmatizer.lemmatize("warmup")  # Force the WordNet corpus to load now rather than mid-query
+        return lemmatizer
+
+@lru_cache(maxsize=None)
+def get_contractions():
+    """
+    Return a regex matching the contractions word_tokenize splits once punctuation is removed (e.g. "cannot").
+    """
+    from nltk.tokenize.destructive import MacIntyreContractions
+    return re.compile("|".join(pattern.replace("(?i)", "") for pattern in
+                               MacIntyreContractions.CONTRACTIONS2 + MacIntyreContractions.CONTRACTIONS3),
+                      re.IGNORECASE)
+
+def __getattr__(name):
+    # Lazy module attributes kept for code that used the former import-time globals
+    if name == "STOP_WORDS":
+        return get_stop_words()
+    if name == "lemmatizer":
+        return get_lemmatizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word):
+    """Lemmatize a single token, memoizing the result."""
+    return get_lemmatizer().lemmatize(word)
+
+def tokenize(text):
+    """
+    Split lowercased, punctuation-free text into tokens exactly like word_tokenize.
+
+    Falls back to word_tokenize only for text containing a contraction it would split (e.g. "cannot").
+    """
+    if get_contractions().search(text + " "):  # word_tokenize pads the text, so trailing "wanna" is split too
+        require_nltk_resource("tokenizers/punkt_tab", "punkt_tab")
+        from nltk.tokenize import word_tokenize
+        return word_tokenize(text)
+    return text.split()
 
 def preprocess_text(text):
     text = text.lower()  # Convert to lowercase
-    text = re.sub(r"[^\w\s]", "", text)  # Remove punctuation
-    tokens = word_tokenize(text)  # Tokenize
-    tokens = [lemmatizer.lemmatize(word) for word in tokens if word not in STOP_WORDS]  # Lemmatize & remove stop words
+    text = PUNCTUATION.sub("", text)  # Remove punctuation
+    tokens = tokenize(text)  # Tokenize
+    stop_words = get_stop_words()
+    tokens = [lemmatize(word) for word in tokens if word not in stop_words]  # Lemmatize & remove stop words
     return tokens
+
+def text_tokenize_lemmatize(text):
+    """
+    Prepare text for the subject classifier: letters only, lowercased, whitespace-tokenized and lemmatized.
+    """
+    text = re.sub(r'[^a-zA-Z]', ' ', text).lower()
+    return ' '.join(lemmatize(w) for w in text.split())
+
+def preprocess_batch(texts, processes=None, chunksize=256):
+    """
+    Preprocess many texts, streaming them through a process pool.
+
+    Results are yielded in input order and give the same tokens as preprocess_text.
+
+    :param texts: Iterable of strings, consumed lazily.
+    :param processes: Number of worker processes. Defaults to the CPU count; 1 runs in this process.
+    :param chunksize: Number of texts sent to a worker at a time.
+    :return: Generator of token lists.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        yield from map(preprocess_text, texts)
+        return
+    with Pool(processes) as pool:
+        yield from pool.imap(preprocess_text, texts, chunksize)
@@ -0,0 +1,217 @@
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+SHORT_PREFIX = 2  # Completions of prefixes up to this length are memoized (their term ranges are large)
+VERSION = 2  # Version 1 files hashed the deletes with CRC32
+FNV_OFFSET, FNV_PRIME = 2166136261, 16777619  # 32-bit FNV-1a
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Damerau-Levenshtein (optimal string alignment) distance between two strings:
+    insertions, deletions, substitutions and transpositions of adjacent characters.
+
+    :param max_distance: Stop early and return max_distance + 1 once the distance is known to exceed it.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(word, max_distance):
+    """Return the word and every string obtained by deleting up to max_distance of its characters."""
+    variants = {word}
+    for count in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), count):
+            variants.add("".join(char for i, char in enumerate(word) if i not in positions))
+    return variants
+
+
+def _hash(text):
+    """FNV-1a hash of the code points of a string, stable across processes (unlike hash())."""
+    value = FNV_OFFSET
+    for char in text:
+        value = ((value ^ ord(char)) * FNV_PRIME) & 0xFFFFFFFF
+    return value
+
+
+def _hash_rows(codes):
+    """Return the _hash of every row of a 2-D uint32 array of code points, each row one string."""
+    hashes = np.full(len(codes), FNV_OFFSET, dtype=np.uint32)
+    for column in codes.T:
+        hashes = (hashes ^ column) * np.uint32(FNV_PRIME)  # Wraps around like the & 0xFFFFFFFF in _hash
+    return hashes
+
+
+class _SortedTerms:
+    """Sequence view of the UTF-8 encoded terms, for binary search with bisect."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class Vocabulary:
+    """
+    A compact index vocabulary for prefix autocompletion and spelling correction.
+
+    Terms are stored sorted in one UTF-8 blob with offsets, next to their document frequencies, so a
+    prefix maps to a contiguous range found by binary search. Corrections use SymSpell-style
+    precomputed deletes: every term prefix of up to prefix_length characters, with up to
+    max_distance characters deleted, is stored as a 32-bit FNV-1a hash next to the term ID (hashed with
+    numpy, a deletion pattern at a time). A misspelled word generates its own deletes and looks them up
+    in the sorted hash array; candidates are then verified with the Damerau-Levenshtein distance. Memory is about 12 bytes per delete plus the terms themselves.
+    """
+
+    def __init__(self, blob, offsets, doc_freqs, delete_hashes, delete_terms, max_distance=2, prefix_length=7):
+        self.blob = blob
+        self.offsets = offsets
+        self.doc_freqs = doc_freqs
+        self.delete_hashes = delete_hashes  # Sorted
+        self.delete_terms = delete_terms  # Term ID of each delete hash
+        self.max_distance = int(max_distance)
+        self.prefix_length = int(prefix_length)
+        self._terms = _SortedTerms(blob, offsets)
+        self._short_completions = lru_cache(maxsize=None)(self._range_completions)
+
+    @classmethod
+    def build(cls, doc_freqs, max_distance=2, prefix_length=7):
+        """
+        Build the vocabulary of an index.
+
+        :param doc_freqs: Mapping of term -> document frequency (e.g. the number of postings of each token).
+        :param max_distance: Largest edit distance corrected.
+        :param prefix_length: Number of leading characters of each term indexed for corrections.
+                              Smaller values use less memory but verify more candidates.
+        """
+        terms = sorted(term for term, doc_freq in doc_freqs.items() if doc_freq)  # Code point order is UTF-8 byte order
+        encoded = [term.encode("utf-8") for term in terms]
+        offsets = np.concatenate([[0], np.cumsum([len(term) for term in encoded])]).astype(np.int64)
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        # The deletes of all prefixes of one length are hashed together, one deletion pattern at a time
+        prefixes = np.frombuffer("".join(term[:prefix_length].ljust(prefix_length, "\0") for term in terms)
+                                 .encode("utf-32-le"), dtype=np.uint32).reshape(len(terms), prefix_length)
+        lengths = np.array([min(len(term), prefix_length) for term in terms], dtype=np.int64)
+        keys = [np.empty(0, dtype=np.uint64)]  # Hash in the high 32 bits, term ID in the low ones
+        for length in range(1, prefix_length + 1):
+            term_ids = np.flatnonzero(lengths == length)
+            codes = prefixes[term_ids, :length]
+            for count in range(min(max_distance, length) + 1):
+                for deleted in combinations(range(length), count):
+                    kept = [i for i in range(length) if i not in deleted]
+                    keys.append(_hash_rows(codes[:, kept]).astype(np.uint64) << np.uint64(32) | term_ids.astype(np.uint64))
+        keys = np.sort(np.concatenate(keys))  # By hash
+        unique = np.ones(len(keys), dtype=bool)
+        unique[1:] = keys[1:] != keys[:-1]  # Drops repeated deletes of a term, e.g. "hello" -> "helo" twice
+        keys = keys[unique]
+        return cls(blob, offsets, np.fromiter(map(doc_freqs.__getitem__, terms), dtype=np.int32, count=len(terms)),
+                   (keys >> np.uint64(32)).astype(np.uint32), (keys & np.uint64(0xFFFFFFFF)).astype(np.int32),
+                   max_distance, prefix_length)
+
+    def save(self, path):
+        """Save the vocabulary as a NumPy .npz file."""
+        with open(path, "wb") as f:  # A file object keeps numpy from appending ".npz" to the name
+            np.savez(f, blob=self.blob, offsets=self.offsets, doc_freqs=self.doc_freqs,
+                     delete_hashes=self.delete_hashes, delete_terms=self.delete_terms,
+                     settings=np.array([self.max_distance, self.prefix_length, VERSION]))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a vocabulary saved with save.
+
+        :raises ValueError: If the file was saved by an earlier version, whose delete hashes differ.
+        """
+        with np.load(path) as data:
+            if len(data["settings"]) < 3 or data["settings"][2] != VERSION:
+                raise ValueError(f"Vocabulary file {path} was saved by an earlier version.")
+            max_distance, prefix_length, _ = data["settings"]
+            return cls(data["blob"], data["offsets"], data["doc_freqs"], data["delete_hashes"],
+                       data["delete_terms"], max_distance, prefix_length)
+
+    def __len__(self):
+        return len(self._terms)
+
+    def term(self, term_id):
+        return self._terms[term_id].decode("utf-8")
+
+    def __contains__(self, term):
+        key = term.encode("utf-8")
+        i = bisect_left(self._terms, key)
+        return i < len(self._terms) and self._terms[i] == key
+
+    def _range_completions(self, prefix, limit):
+        key = prefix.encode("utf-8")
+        low = bisect_left(self._terms, key)
+        high = bisect_left(self._terms, key + b"\xff", low)  # No UTF-8 sequence contains 0xff
+        doc_freqs = self.doc_freqs[low:high]
+        if limit < len(doc_freqs):
+            # Partial selection of the most frequent terms; ties at the cut keep the first ones alphabetically
+            kth = np.partition(-doc_freqs, limit - 1)[limit - 1]
+            top = np.flatnonzero(-doc_freqs < kth)
+            top = np.concatenate([top, np.flatnonzero(-doc_freqs == kth)[:limit - len(top)]])
+        else:
+            top = np.arange(len(doc_freqs))
+        top = top[np.lexsort((top, -doc_freqs[top]))]  # Most frequent first, ties in alphabetical order
+        return tuple((self.term(low + i), int(doc_freqs[i])) for i in top)
+
+    def complete(self, prefix, limit=10):
+        """
+        Return the terms starting with a prefix, most frequent first.
+
+        :param prefix: Lower-case prefix of a preprocessed term.
+        :param limit: Maximum number of completions.
+        :return: List of (term, document frequency) pairs.
+        """
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX:
+            return list(self._short_completions(prefix, limit))
+        return list(self._range_completions(prefix, limit))
+
+    def corrections(self, word, max_distance=None, limit=5):
+        """
+        Return the terms within a bounded edit distance of a word, closest and most frequent first.
+
+        :param word: Preprocessed (lower-case, lemmatized) word.
+        :param max_distance: Largest edit distance, at most the one the vocabulary was built with.
+        :param limit: Maximum number of corrections.
+        :return: List of (term, distance, document frequency) tuples; the word itself at distance 0 if known.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        hashes = np.array(sorted({_hash(variant) for variant in _deletes(word[:self.prefix_length], max_distance)}),
+                          dtype=np.uint32)
+        low = np.searchsorted(self.delete_hashes, hashes, side="left")
+        high = np.searchsorted(self.delete_hashes, hashes, side="right")
+        candidates = {int(term_id) for start, end in zip(low, high) for term_id in self.delete_terms[start:end]}
+
+        matches = []
+        for term_id in candidates:
+            term = self.term(term_id)
+            distance = edit_distance(word, term, max_distance)
+            if distance <= max_distance:
+                matches.append((term, distance, int(self.doc_freqs[term_id])))
+        matches.sort(key=lambda x: (x[1], -x[2], x[0]))
+        return matches[:limit]